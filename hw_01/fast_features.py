@@ -0,0 +1,333 @@
+import re
+import time
+import zlib
+from html import unescape
+from html.parser import attrfind_tolerant, endtagfind, locatestarttagend_tolerant, tagfind_tolerant
+from sys import argv
+
+from features import feature_to_idx, safe_divide
+
+# Html is scanned at about 7 MB/s (TextHTMLParser with easy_tokenizer is about 3 times slower).
+# Scan of one document stops after TIME_BUDGET seconds, so only documents larger than about 700 KB are affected:
+# words and tags are counted only in the scanned prefix and compressed sizes of the prefix are extrapolated
+# to the whole document by its length. Time is checked every CHECK_EVERY tags and every CHECK_CHARS characters,
+# so the budget is exceeded by about the time of CHECK_CHARS characters, unless a single tag is huge:
+# it is matched at once by the regexes of HTMLParser (a tag of megabytes of attributes takes about a second)
+TIME_BUDGET = 0.1
+CHECK_EVERY = 256  # tags between checks of time
+CHECK_CHARS = 1 << 16  # characters between checks of time
+COMPRESS_BLOCK = 1 << 16
+
+_MARKUP = re.compile(r'''
+    <!--[\s\S]*?--\s*>  # comment
+  | <[!?][^>]*>         # doctype, processing instruction
+''', re.X)
+_ATTRS = re.compile('(?:%s)*' % attrfind_tolerant.pattern)  # all attributes as HTMLParser.parse_starttag finds them
+_CDATA_END = {name: re.compile(r'</\s*%s\s*>' % name, re.I) for name in ('script', 'style')}
+_ENTITY_CUT = re.compile(r'[\s;]')
+_WORD = re.compile(r'[^\W_]+')  # the same as easy_tokenizer: isalnum is \w without _
+_TEXT_CUT = re.compile(r'[^\w&#;]|_')  # text may be cut before it: not a part of word or entity
+
+
+def _start_tag_end(html_data, i):
+    """End of start tag at i as by HTMLParser.check_for_whole_start_tag, -1 if tag is unfinished"""
+    j = locatestarttagend_tolerant.match(html_data, i).end()
+    next_symb = html_data[j:j + 1]
+    if next_symb == '>':
+        return j + 1
+    if next_symb == '/':
+        return j + 2 if html_data.startswith('/>', j) else -1
+    if not next_symb or next_symb.isascii() and next_symb.isalpha() or next_symb == '=':
+        return -1
+    return j
+
+
+def _end_tag_end(html_data, i):
+    """(end, lower case name) of end tag at i as by HTMLParser.parse_endtag, name is None for bogus comment"""
+    if html_data.find('>', i + 1) < 0:
+        return -1, None
+    match = endtagfind.match(html_data, i)  # </ a > too
+    if match:
+        return match.end(), match.group(1).lower()
+    match = tagfind_tolerant.match(html_data, i + 2)
+    if match:
+        return html_data.find('>', match.end()) + 1, match.group(1).lower()
+    return html_data.find('>', i + 2) + 1, None
+
+
+class HTMLStats:
+    """
+    Words of title, text and anchors, number of scripts and compressed sizes of html, computed in one scan.
+    Text is split the same way as TextHTMLParser splits it: title is the last text inside <title>,
+    text of <a> is anchors, text of <script> and <style> is not unescaped.
+    Words are found and html is compressed as the scan goes, so time of the scan is all time of document
+    """
+
+    def __init__(self, html_data, time_budget=TIME_BUDGET):
+        self.html_data = html_data
+        self.title = ''
+        self.text_words = []
+        self.anchors_words = []
+        self.scripts_cnt = 0
+        self.truncated = False
+
+        self._zlib = zlib.compressobj()
+        self._gzip = zlib.compressobj(9, zlib.DEFLATED, -15)  # gzip is raw deflate with 18 bytes of header and trailer
+        self._zlib_size = 0
+        self._gzip_size = 18
+        self._compressed = 0
+        self._deadline = time.perf_counter() + time_budget
+        self._checked = 0
+
+        self._in_title = False
+        self._in_anchor = False
+        self._scan()
+        if not self.truncated and self._in_budget(len(html_data)):
+            self._compress(len(html_data))
+        self._zlib_size += len(self._zlib.flush())
+        self._gzip_size += len(self._gzip.flush())
+        if self.truncated:
+            scale = len(html_data) / max(self._compressed, 1)
+            self._zlib_size = round(self._zlib_size * scale)
+            self._gzip_size = round((self._gzip_size - 18) * scale) + 18
+
+    def _compress(self, end):
+        data = self.html_data[self._compressed:end].encode('utf-8')
+        self._zlib_size += len(self._zlib.compress(data))
+        self._gzip_size += len(self._gzip.compress(data))
+        self._compressed = end
+
+    def _in_budget(self, pos):
+        """
+        Html before pos is scanned: compression is caught up by blocks of COMPRESS_BLOCK
+        and time is checked before every block
+        """
+        self._checked = pos
+        while True:
+            if time.perf_counter() > self._deadline:
+                self.truncated = True
+                self._compress(min(pos, self._compressed + COMPRESS_BLOCK))
+                return False
+            if pos - self._compressed < COMPRESS_BLOCK:
+                return True
+            self._compress(self._compressed + COMPRESS_BLOCK)
+
+    def _add_text(self, start, end, raw=False):
+        """
+        Text html_data[start:end], long text is taken by pieces of CHECK_CHARS to 2 * CHECK_CHARS characters
+        cut before _TEXT_CUT (so words and entities are not cut, only runs of letters, digits and entities
+        longer than CHECK_CHARS are)
+        with check of time after every piece.
+        Returns False if time is over
+        """
+        html_data = self.html_data
+        title = []
+        words = []
+        blank = True
+        while start < end:
+            cut = end
+            if end - start > CHECK_CHARS:
+                match = _TEXT_CUT.search(html_data, start + CHECK_CHARS, min(start + 2 * CHECK_CHARS, end))
+                cut = match.start() if match else min(start + 2 * CHECK_CHARS, end)
+            text = html_data[start:cut]
+            if not raw and '&' in text:
+                text = unescape(text)
+            blank = blank and not text.strip()
+            if self._in_title:
+                title.append(text)
+            else:
+                words.extend(_WORD.findall(text.lower()))
+            start = cut
+            if start - self._checked >= CHECK_CHARS and not self._in_budget(start):
+                break
+        if not blank:
+            if self._in_title:
+                self.title = ''.join(title)
+            elif self._in_anchor:
+                self.anchors_words.extend(words)
+            else:
+                self.text_words.extend(words)
+        return not self.truncated
+
+    def _end_tag(self, name):
+        if name == 'title':
+            self._in_title = False
+        elif name == 'a':
+            self._in_anchor = False
+
+    def _scan(self):
+        html_data = self.html_data
+        n = len(html_data)
+        pos = 0
+        tags = 0
+        while pos < n:
+            lt = html_data.find('<', pos)
+            if lt < 0:
+                # as HTMLParser without close(): text is kept back if it may end by a part of entity
+                amppos = html_data.rfind('&', max(pos, n - 34))
+                if amppos < 0 or _ENTITY_CUT.search(html_data, amppos):
+                    self._add_text(pos, n)
+                break
+            if lt > pos and not self._add_text(pos, lt):
+                break
+
+            next_symb = html_data[lt + 1:lt + 2]
+            name = None
+            if next_symb.isascii() and next_symb.isalpha():
+                pos = _start_tag_end(html_data, lt)
+            elif next_symb == '/':
+                pos, name = _end_tag_end(html_data, lt)
+            elif next_symb in ('!', '?'):
+                match = _MARKUP.match(html_data, lt)
+                pos = match.end() if match else -1
+            elif next_symb:
+                self._add_text(lt, lt + 1)
+                pos = lt + 1
+                continue
+            else:
+                pos = -1
+            if pos < 0:
+                break  # unfinished markup at the end of document
+
+            tags += 1
+            if (tags % CHECK_EVERY == 0 or pos - self._checked >= CHECK_CHARS) and not self._in_budget(pos):
+                break
+
+            if next_symb == '/':
+                self._end_tag(name)
+                continue
+            if next_symb in ('!', '?'):
+                continue
+            tag = tagfind_tolerant.match(html_data, lt + 1)
+            rest = html_data[_ATTRS.match(html_data, tag.end()).end():pos].strip()
+            if rest not in ('>', '/>'):
+                # HTMLParser takes tag with junk after attributes as text
+                if not self._add_text(lt, pos, raw=True):
+                    break
+                continue
+            if rest == '/>':
+                continue  # <tag/> changes nothing but counts of img and link, they are not features
+
+            name = tag.group(1).lower()
+            if name == 'title':
+                self._in_title = True
+            elif name == 'a':
+                self._in_anchor = True
+            elif name == 'script':
+                self.scripts_cnt += 1
+            if name in _CDATA_END:
+                end = _CDATA_END[name].search(html_data, pos)
+                if end is None:
+                    break
+                if end.start() > pos and not self._add_text(pos, end.start(), raw=True):
+                    break
+                pos = end.end()
+
+    def words(self):
+        """Lower case words of title, text and anchors"""
+        return {
+            'title': _WORD.findall(self.title.lower()),
+            'text': self.text_words,
+            'anchors': self.anchors_words,
+        }
+
+    def compression(self):
+        """Compressed sizes and levels of html by gzip and zlib as by features.Compression"""
+        return {
+            'gzip_compression_num': self._gzip_size,
+            'gzip_compression_level': safe_divide(len(self.html_data), self._gzip_size),
+            'zlib_compression_num': self._zlib_size,
+            'zlib_compression_level': safe_divide(len(self.html_data), self._zlib_size),
+        }
+
+
+def calc_features_fast(url, html_data, get_keys=False, time_budget=TIME_BUDGET):
+    """The same features as features.calc_features with easy_tokenizer"""
+    if get_keys:
+        return list(feature_to_idx)
+
+    stats = HTMLStats(html_data, time_budget)
+    words = stats.words()
+
+    features = {'scripts_cnt': stats.scripts_cnt, 'words_num': 0}
+    letters_sum = 0
+    unique_words_num = 0
+    for name in ('title', 'text', 'anchors'):
+        features['words_num'] += len(words[name])
+        features[name + '_words_len'] = len(words[name])
+        letters_sum += sum(map(len, words[name]))
+        unique_words_num += len(set(words[name]))
+    features['avg_word_len'] = safe_divide(letters_sum, features['words_num'])
+    features['unique_words_num'] = unique_words_num
+
+    features['url_len'] = len(url)
+    features['url_dots_cnt'] = url.count('.')
+    features['url_slashs_cnt'] = url.count('/')
+    features.update(stats.compression())
+
+    return [features[key] for key in feature_to_idx]
+
+
+# small documents with tricky markup, features of them must be the same as of calc_features
+CHECK_DOCS = [
+    '<body>x <a href=1>link word</ a> tail text</body>',
+    '<title>a title</ title><p>text</p>',
+    '<a href=1>link</ a b> still link</a> text',
+    '<a>x</a >y<a/>z</>w',
+    '<p a="x>y" b=c/>text &amp; &notin &#x41 <b>bold</b> 1 < 2',
+    '<script>var s = "<a>";</ script>x</script><style>p {}</style>y',
+    "<a'b c='>q",
+]
+
+
+def check_features(docs=CHECK_DOCS):
+    """Features of calc_features_fast without time budget are the same as of calc_features with easy_tokenizer"""
+    from features import calc_features, easy_tokenizer
+
+    for html_data in docs:
+        assert calc_features('url', html_data, tokenizer=easy_tokenizer) == \
+            calc_features_fast('url', html_data, time_budget=float('inf')), html_data
+    print("Tests OK")
+
+
+def benchmark(filename, limit=None):
+    """docs/sec of calc_features (TextHTMLParser with easy_tokenizer) and calc_features_fast on csv file"""
+    from features import calc_features, easy_tokenizer
+    from pipeline import parse_line
+
+    check_features()
+    docs = []
+    with open(filename, 'rb') as f:
+        f.readline()
+        for line in f:
+            if line.strip():
+                docs.append(parse_line(line)[2:])
+            if limit and len(docs) >= limit:
+                break
+
+    start = time.perf_counter()
+    slow = [calc_features(url, html_data, tokenizer=easy_tokenizer) for url, html_data in docs]
+    slow_time = time.perf_counter() - start
+
+    fast = []
+    max_time = 0.0
+    truncated = 0
+    start = time.perf_counter()
+    for url, html_data in docs:
+        doc_start = time.perf_counter()
+        fast.append(calc_features_fast(url, html_data))
+        max_time = max(max_time, time.perf_counter() - doc_start)
+    fast_time = time.perf_counter() - start
+    for url, html_data in docs:
+        truncated += HTMLStats(html_data).truncated
+
+    mismatches = sum(slow_features != fast_features for slow_features, fast_features in zip(slow, fast))
+    print(f'Documents: {len(docs)}, {sum(len(html_data) for _, html_data in docs) / 2 ** 20:.1f} MB')
+    print(f'TextHTMLParser: {len(docs) / slow_time:.1f} docs/sec')
+    print(f'HTMLStats: {len(docs) / fast_time:.1f} docs/sec, x{slow_time / fast_time:.1f}')
+    print(f'Max time of document: {max_time * 1000:.1f} ms, budget {TIME_BUDGET * 1000:.0f} ms, truncated: {truncated}')
+    print(f'Different features: {mismatches}')
+
+
+if __name__ == '__main__':
+    benchmark(argv[1], int(argv[2]) if len(argv) > 2 else None)
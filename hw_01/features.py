@@ -0,0 +1,212 @@
+import gzip
+import re
+import zlib
+from html.parser import HTMLParser
+
+import numpy as np
+
+
+def convert2lower(f):
+    def tmp(text):
+        return f(text.lower())
+    return tmp
+
+
+@convert2lower
+def easy_tokenizer(text):
+    word = ''
+    for symbol in text:
+        if symbol.isalnum(): word += symbol
+        elif word:
+            yield word
+            word = ''
+    if word: yield word
+
+
+PYMORPHY_CACHE = {}
+MORPH = None
+
+#hint, чтобы установка pymorphy2 не была бы обязательной
+def get_lemmatizer():
+    global MORPH
+    import pymorphy2
+    if MORPH is None: MORPH = pymorphy2.MorphAnalyzer()
+    return MORPH
+
+
+def pymorphy_tokenizer(text):
+    for word in easy_tokenizer(text):
+        word_hash = hash(word)
+        if word_hash not in PYMORPHY_CACHE:
+            PYMORPHY_CACHE[word_hash] = get_lemmatizer().parse(word)[0].normal_form
+        yield PYMORPHY_CACHE[word_hash]
+
+
+try:
+    import pymorphy2
+    DEFAULT_TOKENIZER = pymorphy_tokenizer
+except ImportError:
+    DEFAULT_TOKENIZER = easy_tokenizer
+
+
+class TextHTMLParser(HTMLParser):
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self._text = []
+        self._anchors = []
+        self._title = ""
+        self._in_title = False
+        self._in_anchor = False
+
+        self._script_cnt = 0
+        self._link_cnt = 0
+        self._img_cnt = 0
+
+    def handle_data(self, data):
+        text = data.strip()
+        if len(text) > 0:
+            text = re.sub('[ \t\r\n]+', ' ', text)
+
+            if self._in_title:
+                self._title = text
+            elif self._in_anchor:
+                self._anchors.append(text + ' ')
+            else:
+                self._text.append(text + ' ')
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'p':
+            self._text.append('\n\n')
+        elif tag == 'br':
+            self._text.append('\n')
+        elif tag == 'title':
+            self._in_title = True
+        elif tag == 'a':
+            self._in_anchor = True
+        elif tag == 'script':
+            self._script_cnt += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        if tag == 'a':
+            self._in_anchor = False
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == 'br':
+            self._text.append('\n\n')
+        elif tag == 'img':
+            self._img_cnt += 1
+        elif tag == 'link':
+            self._link_cnt += 1
+
+    def text(self):
+        return ''.join(self._text).strip()
+
+    def anchors(self):
+        return ''.join(self._anchors).strip()
+
+    def title(self):
+        return self._title
+
+    def images_cnt(self):
+        return self._img_cnt
+
+    def links_cnt(self):
+        return self._link_cnt
+
+    def scripts_cnt(self):
+        return self._script_cnt
+
+    def get_features(self, tokenizer=easy_tokenizer):
+        return {
+            'title'   : tokenizer(self.title()),
+            'text'    : tokenizer(self.text()),
+            'anchors' : tokenizer(self.anchors()),
+            'scripts_cnt' : self.scripts_cnt()
+        }
+
+
+def safe_divide(a, b):
+    if a == 0: return 0.0
+    elif b == 0: return 0.0
+    else: return a / b
+
+
+def get_html_features(raw_html, Parser=TextHTMLParser, tokenizer=DEFAULT_TOKENIZER):
+
+    parser = Parser()
+    parser.feed(raw_html)
+
+    return parser.get_features(tokenizer)
+
+
+class Compression:
+    def __init__(self, html_data, compressor=gzip):
+        self.html_data = html_data
+        self.compressed = compressor.compress(html_data.encode('utf-8'))
+
+    def get_compression_num(self):
+        return len(self.compressed)
+
+    def get_compression_level(self):
+        return safe_divide(len(self.html_data), len(self.compressed))
+
+
+def calc_features(url, html_data, get_keys=False, tokenizer=DEFAULT_TOKENIZER):
+
+    features = get_html_features(html_data, tokenizer=tokenizer)
+
+    names = ['title', 'text', 'anchors']
+    data = {}
+    data_cnt = {}
+
+    features['words_num'] = 0
+    for name in names:
+        data[name] = list(features[name])
+        data_cnt[name] = len(data[name])
+        del features[name]
+        features['words_num'] += data_cnt[name]
+        features[name + '_words_len'] = data_cnt[name]
+
+    # Words
+
+    letters_sum = 0
+    data_lengths = {}
+    for name in names:
+        data_lengths[name] = []
+        for word in data[name]:
+            data_lengths[name].append(len(word))
+        name_sum = np.sum(data_lengths[name])
+        letters_sum += name_sum
+
+    features['avg_word_len'] = safe_divide(letters_sum, features['words_num'])
+
+    # Unique words
+
+    features['unique_words_num'] = 0
+    data_unique = {}
+    for name in names:
+        data_unique[name] = set(data[name])
+        features['unique_words_num'] += len(data_unique[name])
+
+    # URL
+    features['url_len'] = len(url)
+    features['url_dots_cnt'] = url.count('.')
+    features['url_slashs_cnt'] = url.count('/')
+
+    # Compression
+    gzip_compressor = Compression(html_data, gzip)
+    zlib_compressor = Compression(html_data, zlib)
+
+    features['gzip_compression_num'] = gzip_compressor.get_compression_num()
+    features['gzip_compression_level']= gzip_compressor.get_compression_level()
+    features['zlib_compression_num'] = zlib_compressor.get_compression_num()
+    features['zlib_compression_level']= zlib_compressor.get_compression_level()
+
+    if get_keys:
+        return list(features.keys())
+    return list(features.values())
+
+
+feature_to_idx = calc_features('http://ololo', '<html><title>Заголовок</title>спам</html>', get_keys=True)
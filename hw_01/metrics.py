@@ -0,0 +1,172 @@
+import numpy as np
+
+NAMES = ['class_prec', 'class_recall', 'class_F1', 'not_class_prec', 'not_class_recall', 'not_class_F1']
+
+
+def _divide(a, b):
+    """a / b elementwise, 0 where b == 0 (as zero_division of sklearn, but without warning)"""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b != 0)
+
+
+def _scores(y_pred_prob):
+    y_pred_prob = np.asarray(y_pred_prob, dtype=np.float64)
+    return y_pred_prob[:, 1] if y_pred_prob.ndim == 2 else y_pred_prob
+
+
+def _metrics(tp, fp, fn, tn):
+    return {
+        'class_prec' : _divide(tp, tp + fp),
+        'class_recall' : _divide(tp, tp + fn),
+        'class_F1' : _divide(2 * tp, 2 * tp + fp + fn),
+        'not_class_prec' : _divide(tn, tn + fn),
+        'not_class_recall' : _divide(tn, tn + fp),
+        'not_class_F1' : _divide(2 * tn, 2 * tn + fn + fp)
+    }
+
+
+def calculate_metrics(y_true, y_pred_prob=None, y_pred=None, threshold=0.5):
+    """Metrics of both classes, document is of class if its probability is greater than threshold"""
+    y_true = np.asarray(y_true).astype(bool)
+    if y_pred_prob is not None:
+        y_pred = _scores(y_pred_prob) > threshold
+    y_pred = np.asarray(y_pred).astype(bool)
+
+    tp = np.count_nonzero(y_true & y_pred)
+    fp = np.count_nonzero(~y_true & y_pred)
+    fn = np.count_nonzero(y_true & ~y_pred)
+    tn = len(y_true) - tp - fp - fn
+    return {name: float(value) for name, value in _metrics(tp, fp, fn, tn).items()}
+
+
+def threshold_sweep(y_true, y_pred_prob):
+    """
+    Metrics of both classes at every distinct threshold at once.
+    Metrics change only at probabilities of documents, so thresholds are all distinct probabilities
+    (ascending) and one threshold below all of them. Probabilities are sorted once,
+    numbers of documents of class with probabilities <= threshold are cumulative sums in order of sorting.
+    Returns dict of arrays: 'threshold', 'tp', 'fp', 'fn', 'tn' and metrics of NAMES
+    """
+    y_true = np.asarray(y_true).astype(bool)
+    scores = _scores(y_pred_prob)
+    order = np.argsort(scores, kind='stable')
+    scores = scores[order]
+    cum_class = np.concatenate(([0], np.cumsum(y_true[order])))
+
+    thresholds, first = np.unique(scores, return_index=True)
+    # documents with probability <= threshold
+    not_predicted = np.concatenate(([0], first[1:], [len(scores)]))
+    lowest = np.nextafter(thresholds[0], -np.inf) if len(thresholds) else 0.0
+    thresholds = np.concatenate(([lowest], thresholds))
+
+    class_num = cum_class[-1]
+    fn = cum_class[not_predicted]
+    tn = not_predicted - fn
+    tp = class_num - fn
+    fp = len(scores) - not_predicted - tp
+
+    result = {'threshold': thresholds, 'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn}
+    result.update(_metrics(tp, fp, fn, tn))
+    return result
+
+
+def sweep_at(sweep, thresholds):
+    """Sweep at given thresholds: metrics at threshold are metrics at the greatest distinct threshold <= it"""
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    rows = np.maximum(np.searchsorted(sweep['threshold'], thresholds, side='right') - 1, 0)
+    result = {name: values[rows] for name, values in sweep.items()}
+    result['threshold'] = thresholds
+    return result
+
+
+def roc_curve(y_true, y_pred_prob):
+    """fpr, tpr and thresholds, from the highest threshold (0, 0) to the lowest one (1, 1)"""
+    sweep = threshold_sweep(y_true, y_pred_prob)
+    tp, fp = sweep['tp'][::-1], sweep['fp'][::-1]
+    return _divide(fp, fp[-1]), _divide(tp, tp[-1]), sweep['threshold'][::-1]
+
+
+def pr_curve(y_true, y_pred_prob):
+    """precision, recall and thresholds of class, from the highest threshold to the lowest one"""
+    sweep = threshold_sweep(y_true, y_pred_prob)
+    return sweep['class_prec'][::-1], sweep['class_recall'][::-1], sweep['threshold'][::-1]
+
+
+def auc(x, y):
+    """Area under curve by trapezoids, x is monotonic"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return float(abs(np.sum((x[1:] - x[:-1]) * (y[1:] + y[:-1]) / 2)))
+
+
+def best_thresholds(sweep, min_threshold=-np.inf, max_threshold=np.inf):
+    """
+    The lowest thresholds in [min_threshold, max_threshold] with the best mean of F1 of both classes
+    and with the least sum of squared pairwise differences of all metrics (as plot_results chose them)
+    """
+    mask = (sweep['threshold'] >= min_threshold) & (sweep['threshold'] <= max_threshold)
+    if not mask.any():
+        raise ValueError(f'No thresholds in [{min_threshold}, {max_threshold}]')
+    thresholds = sweep['threshold'][mask]
+    metrics = np.stack([sweep[name][mask] for name in NAMES])
+
+    fscore = (sweep['class_F1'][mask] + sweep['not_class_F1'][mask]) / 2
+    # sum over i, j of (m_i - m_j) ^ 2 == 2 * (n * sum(m_i ^ 2) - sum(m_i) ^ 2)
+    diff = 2 * (len(NAMES) * np.sum(metrics ** 2, axis=0) - np.sum(metrics, axis=0) ** 2)
+    return float(thresholds[np.argmax(fscore)]), float(thresholds[np.argmin(diff)])
+
+
+def plot_stats(x, y, title):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(10, 5))
+
+    prec, = plt.plot( x,
+                     [k[0] for k in y], "r", label='Precision',
+                     linewidth=1)
+    accur, = plt.plot( x,
+                      [k[1] for k in y], "b", label='Recall',
+                      linewidth=1)
+    f1, =    plt.plot( x,
+                      [k[2] for k in y], "g", label='F1',
+                      linewidth=1)
+    plt.grid(True)
+    plt.legend(handles=[prec, accur, f1])
+    plt.title(title)
+    plt.show()
+
+
+def arange(start, stop, step):
+    cur_value = start
+    while True:
+        if cur_value > stop: break
+        yield cur_value
+        cur_value += step
+
+
+def plot_results(classifier, X, y_true, min_threshold=0, max_threshold=1, step=None, trace=False):
+    """
+    Metrics at all distinct thresholds, or at arange(min_threshold, max_threshold, step) as before
+    if step is given (then the best thresholds are chosen from these ones)
+    """
+    sweep = threshold_sweep(y_true, classifier.predict_proba(X))
+    if step is not None:
+        sweep = sweep_at(sweep, list(arange(min_threshold, max_threshold, step)))
+    best_threshold_fscore, best_threshold_all = best_thresholds(sweep, min_threshold, max_threshold)
+
+    mask = (sweep['threshold'] >= min_threshold) & (sweep['threshold'] <= max_threshold)
+    th = sweep['threshold'][mask]
+    y_p = np.stack([sweep[name][mask] for name in NAMES[:3]], axis=1)
+    y_n = np.stack([sweep[name][mask] for name in NAMES[3:]], axis=1)
+    if trace:
+        for i, threshold in enumerate(th):
+            r = dict(zip(NAMES, np.concatenate((y_p[i], y_n[i])).tolist()))
+            print('threshold %s' % threshold)
+            print('\t{}'.format(r))
+            print('\t\tMacroF1Mesure %s' % ((r['class_F1'] + r['not_class_F1'])/2))
+    plot_stats(th, y_p, "Class Result")
+    plot_stats(th, y_n, "Not class Result")
+    print(f"Best threshold by f1 = {best_threshold_fscore}")
+    print(f"Best threshold by precision, recall, f1 = {best_threshold_all}")
+    return best_threshold_fscore, best_threshold_all
@@ -0,0 +1,167 @@
+import base64
+import gzip
+import logging
+import os
+import time
+from collections import namedtuple, deque
+from multiprocessing import Pool
+
+import numpy as np
+
+from features import calc_features
+
+logger = logging.getLogger(__name__)
+
+DocItem = namedtuple('DocItem', ['doc_id', 'is_spam', 'url', 'features'])
+Batch = namedtuple('Batch', ['doc_ids', 'is_spam', 'urls', 'features'])
+# doc_ids, is_spam and features are numpy arrays, features is (docs x features) matrix of dtype of calc_batches
+
+TRACE_NUM = 1000
+
+
+def parse_line(line):
+    """(url_id, mark, url, html_data) of line of input csv, line is bytes"""
+    parts = line.strip().split(b'\t')
+    url_id = int(parts[0])
+    mark = bool(int(parts[1]))
+    url = parts[2].decode('utf-8')
+    pageInb64 = parts[3]
+    html_data = base64.b64decode(pageInb64)
+    try:
+        html_data = html_data.decode('utf-8')
+    except UnicodeDecodeError:
+        html_data = html_data.decode('latin1')
+    return url_id, mark, url, html_data
+
+
+def file_chunks(filename, chunk_size=1 << 23):
+    """Byte ranges (start, end) of file without header, every range is about chunk_size bytes and ends at the end of line"""
+    size = os.path.getsize(filename)
+    chunks = []
+    with open(filename, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def read_chunk(filename, start, end):
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).splitlines()
+
+
+def gzip_batches(filename, chunk_size=1 << 23):
+    """Lists of lines of gzipped file without header, about chunk_size bytes each; gzip can't be read from offset"""
+    with gzip.open(filename, 'rb') as f:
+        f.readline()
+        lines = []
+        size = 0
+        for line in f:
+            lines.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield lines
+                lines = []
+                size = 0
+        if lines:
+            yield lines
+
+
+def _calc_batch(args):
+    """Features of batch, batch is byte range of file or list of lines"""
+    calc_features_f, dtype, source = args
+    lines = read_chunk(*source) if isinstance(source, tuple) else source
+
+    doc_ids, marks, urls, features = [], [], [], []
+    for line in lines:
+        if not line.strip():
+            continue
+        url_id, mark, url, html_data = parse_line(line)
+        doc_ids.append(url_id)
+        marks.append(mark)
+        urls.append(url)
+        features.append(calc_features_f(url, html_data))
+
+    features = np.array(features, dtype=dtype)
+    if not len(features):
+        features = features.reshape(0, len(calc_features_f('', '', get_keys=True)))
+    return Batch(np.array(doc_ids, dtype=np.int64), np.array(marks, dtype=bool), urls, features)
+
+
+def calc_batches(filename, calc_features_f=calc_features, workers=None, chunk_size=1 << 23, max_pending=None,
+                 dtype=np.float64):
+    """
+    Features of documents of csv (or csv.gz) file by batches, in order of file.
+    Plain file is split into byte ranges which workers read by themselves, gzipped file is read
+    by this process once and its lines are sent to workers.
+    At most max_pending batches (2 per worker by default) are in work or done and not taken yet,
+    so memory doesn't depend on the size of file.
+    calc_features_f is called in workers, so it has to be defined at module level.
+    Features are float64 by default, so they are equal to features of the notebook;
+    float32 takes half of memory, but rounds them to 7 significant digits (e.g. compression levels)
+    """
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    if filename.endswith('gz'):
+        sources = gzip_batches(filename, chunk_size)
+    else:
+        sources = ((filename, start, end) for start, end in file_chunks(filename, chunk_size))
+    tasks = ((calc_features_f, dtype, source) for source in sources)
+
+    start_time = time.time()
+    docs_num = 0
+    traced = 0
+
+    def trace(batch):
+        nonlocal docs_num, traced
+        docs_num += len(batch.doc_ids)
+        if docs_num // TRACE_NUM > traced:
+            traced = docs_num // TRACE_NUM
+            elapsed = time.time() - start_time
+            logger.info('Complete items %05d, %.1f docs/sec', docs_num, docs_num / elapsed if elapsed else 0.0)
+
+    if workers == 1:
+        for task in tasks:
+            batch = _calc_batch(task)
+            trace(batch)
+            yield batch
+    else:
+        with Pool(workers) as pool:
+            # not pool.imap: it takes all tasks from iterator at once, so gzipped file would be read into memory
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_calc_batch, (task,)))
+                if len(pending) >= max_pending:
+                    batch = pending.popleft().get()
+                    trace(batch)
+                    yield batch
+            while pending:
+                batch = pending.popleft().get()
+                trace(batch)
+                yield batch
+    logger.info('Complete items %05d in %.1f sec', docs_num, time.time() - start_time)
+
+
+def load_features(filename, calc_features_f=calc_features, workers=None, chunk_size=1 << 23, dtype=np.float64):
+    """All features of file as one Batch"""
+    batches = list(calc_batches(filename, calc_features_f, workers, chunk_size, dtype=dtype))
+    if not batches:
+        return _calc_batch((calc_features_f, dtype, []))
+    return Batch(np.concatenate([batch.doc_ids for batch in batches]),
+                 np.concatenate([batch.is_spam for batch in batches]),
+                 [url for batch in batches for url in batch.urls],
+                 np.concatenate([batch.features for batch in batches]))
+
+
+def load_csv_multiprocess(input_file_name, calc_features_f=calc_features, workers=None):
+    """DocItems of file in order, as in the notebook"""
+    for batch in calc_batches(input_file_name, calc_features_f, workers):
+        for doc_id, is_spam, url, features in zip(batch.doc_ids.tolist(), batch.is_spam.tolist(),
+                                                  batch.urls, batch.features.tolist()):
+            yield DocItem(doc_id, is_spam, url, features)
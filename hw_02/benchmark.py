@@ -0,0 +1,207 @@
+import os
+import gzip
+import time
+from sys import argv
+
+import numpy as np
+
+from coders import Simple9Coder, VarByteCoder, BlockCoder
+from index import load_data
+from tokenizer import Tokenizer, MorphAnalyzer
+import search
+
+
+def timeit(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def load_postings(dirname='load_data'):
+    reversed_index = load_data(dirname=dirname)[0]
+    return [reversed_index.docs(key) for key in reversed_index.keys()]
+
+
+def bench_coders(dirname='load_data'):
+    """Encode and decode speed (ints/sec) on d-gaps of the real posting lists"""
+    postings = load_postings(dirname)
+    gaps = np.concatenate([np.diff(docs, prepend=0) for docs in postings])
+    print(f"Posting lists: {len(postings)}, ints: {len(gaps)}")
+
+    for IntCoder in (Simple9Coder, VarByteCoder):
+        coder = IntCoder()
+        encode_time, data = timeit(coder.encode, gaps)
+        decode_time, result = timeit(coder.decode, data)
+        assert np.array_equal(result, gaps)
+        print(f"{IntCoder.__name__}: {len(data) / len(gaps):.2f} bytes/int, "
+              f"encode {len(gaps) / encode_time:,.0f} ints/sec, decode {len(gaps) / decode_time:,.0f} ints/sec")
+
+        block_coder = BlockCoder(IntCoder)
+        long_postings = [docs for docs in postings if len(docs) >= block_coder.block_size]
+        size = sum(len(docs) for docs in long_postings)
+        encode_time, data = timeit(lambda: [block_coder.encode(docs)[0] for docs in long_postings])
+        decode_time, _ = timeit(lambda: [block_coder.decode(elem) for elem in data])
+        print(f"    BlockCoder on {len(long_postings)} lists with >= {block_coder.block_size} docs: "
+              f"encode {size / encode_time:,.0f} ints/sec, decode {size / decode_time:,.0f} ints/sec")
+
+
+def linear_and(docs1, docs2, max_docID):
+    """Conjunction as it was done before cursors: operands move forward one element at a time"""
+    cur = [0, 0]
+
+    def run(i, docs, docID):
+        while cur[i] < len(docs) and docID > docs[cur[i]]:
+            cur[i] += 1
+        return docs[cur[i]] if cur[i] < len(docs) else float("inf")
+
+    documents = []
+    docID = -1
+    while docID <= max_docID:
+        foundID = max(run(0, docs1, docID), run(1, docs2, docID))
+        if foundID == docID:
+            if docID != -1:
+                documents.append(docID)
+            docID += 1
+        else:
+            docID = foundID
+    return documents
+
+
+def cursor_and(word1, word2, max_docID):
+    segment = search.reversed_index.segments[0]
+    head = search.NodeTree('B', '&', search.NodeTree('O', word1, segment), search.NodeTree('O', word2, segment))
+    documents = []
+    docID = head.next_geq(0)
+    while docID <= max_docID:
+        documents.append(docID)
+        docID = head.next_geq(docID + 1)
+    return documents
+
+
+def bench_cursor(dirname='load_data', pairs=10):
+    """Conjunction of rare and very common term: linear merge against skips and galloping"""
+    reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=dirname)
+    search.reversed_index, search.word_to_ID = reversed_index, word_to_ID
+    max_docID = reversed_index.max_docID
+
+    by_df = sorted(word_to_ID, key=lambda word: reversed_index.df(word_to_ID[word]))
+    rare = [word for word in by_df if 3 <= reversed_index.df(word_to_ID[word]) <= 10][:pairs]
+    common = by_df[::-1][:pairs]
+
+    linear_total = cursor_total = 0
+    for word1, word2 in zip(rare, common):
+        docs1, docs2 = reversed_index[word_to_ID[word1]], reversed_index[word_to_ID[word2]]
+        linear_time, expected = timeit(linear_and, docs1, docs2, max_docID)
+        cursor_time, result = timeit(cursor_and, word1, word2, max_docID)
+        assert result == expected
+        linear_total += linear_time
+        cursor_total += cursor_time
+        print(f"df {len(set(docs1)):>3} & df {len(set(docs2)):>5}: "
+              f"linear {linear_time * 1000:7.3f} ms, cursor {cursor_time * 1000:7.3f} ms, "
+              f"speedup {linear_time / cursor_time:6.1f}x")
+    print(f"Total: linear {linear_total * 1000:.3f} ms, cursor {cursor_total * 1000:.3f} ms, "
+          f"speedup {linear_total / cursor_total:.1f}x")
+
+
+def bench_rank(dirname='load_data', k=10, queries=10):
+    """Top-k by BM25: WAND against scoring of all documents with query words"""
+    reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=dirname)
+    search.reversed_index, search.docID_to_url, search.word_to_ID = reversed_index, docID_to_url, word_to_ID
+
+    words = [word for word in word_to_ID if word.isalpha()]
+    by_df = sorted(words, key=lambda word: reversed_index.df(word_to_ID[word]), reverse=True)
+    common = by_df[20:20 + 2 * queries]
+    rare = by_df[2000:2000 + queries]
+    for query in [f"{word1} {word2}" for word1, word2 in zip(common[::2], common[1::2])] + \
+                 [f"{word1} {word2}" for word1, word2 in zip(common, rare)]:
+        wand_time, result = timeit(lambda: search.RankedQuery(query, k).search())
+        full_time, expected = timeit(lambda: search.RankedQuery(query, k).search(prune=False))
+        assert result == expected
+        wand, full = search.RankedQuery(query, k), search.RankedQuery(query, k)
+        wand.search()
+        full.search(prune=False)
+        print(f"{query:>30}: all {full_time * 1000:7.2f} ms ({full.scored:>5} scored), "
+              f"WAND {wand_time * 1000:7.2f} ms ({wand.scored:>5} scored), speedup {full_time / wand_time:5.1f}x")
+
+
+def run_query(query):
+    return search.QueryTree(query).search()
+
+
+def bench_bitmap(dirname='load_data', queries=5):
+    """Boolean queries on dense words: bitmaps of segments against iteration by cursors"""
+    reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=dirname)
+    search.reversed_index, search.docID_to_url, search.word_to_ID = reversed_index, docID_to_url, word_to_ID
+
+    words = [word for word in word_to_ID if word.isalpha()]
+    common = sorted(words, key=lambda word: reversed_index.df(word_to_ID[word]), reverse=True)[:2 * queries]
+    is_dense = search.QueryTree.is_dense
+    for word1, word2 in zip(common[::2], common[1::2]):
+        for query in (f"!{word1}", f"{word1} & {word2}", f"{word1} | {word2}", f"{word1} & !{word2}"):
+            bitmap_time, result = timeit(run_query, query)
+            search.QueryTree.is_dense = lambda self, plan, segment: False
+            cursor_time, expected = timeit(run_query, query)
+            search.QueryTree.is_dense = is_dense
+            assert result == expected
+            print(f"{query:>20}: cursors {cursor_time * 1000:7.2f} ms, bitmaps {bitmap_time * 1000:7.2f} ms, "
+                  f"speedup {cursor_time / bitmap_time:5.1f}x")
+
+
+def separators_words(text):
+    """Old splitting of index (index_sh before tokenizer): all symbols with code <= 32 are separators, char by char"""
+    clean_words = ""
+    for c in text.lower():
+        if ord(c) > 32:
+            clean_words += c
+        else:
+            clean_words += ' '
+    return clean_words.split()
+
+
+def char_loop_words(text):
+    """Old splitting of queries: words of letters are collected char by char"""
+    words = []
+    buffer = ''
+    for ch in text.lower():
+        if ch.isalpha():
+            buffer += ch
+        elif buffer:
+            words.append(buffer)
+            buffer = ''
+    if buffer:
+        words.append(buffer)
+    return words
+
+
+def bench_tokenizer(dirname='dumps', size=2**23):
+    """Speed (MB/s of utf-8 text) of tokenizer against old loops of index and queries"""
+    with gzip.open(f"{dirname}/{sorted(os.listdir(dirname))[0]}") as f:
+        text = f.read(size).decode('utf-8', errors='ignore')
+    megabytes = len(text.encode('utf-8')) / 2**20
+
+    tokenizers = [('separators (old index)', separators_words), ('char loop (old query)', char_loop_words),
+                  ('tokenizer', Tokenizer().words)]
+    if MorphAnalyzer is not None:
+        tokenizers.append(('tokenizer + lemmas', Tokenizer(lemmatize=True).words))
+    for name, words in tokenizers:
+        seconds, result = timeit(words, text)
+        print(f"{name:>25}: {megabytes / seconds:7.2f} MB/s, {len(result)} words")
+
+
+BENCHMARKS = {
+    'coders': bench_coders,
+    'cursor': bench_cursor,
+    'rank': bench_rank,
+    'bitmap': bench_bitmap,
+    'tokenizer': bench_tokenizer,
+}
+
+
+if __name__ == '__main__':
+    names = argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"=== {name} ===")
+        BENCHMARKS[name]()
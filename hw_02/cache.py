@@ -0,0 +1,90 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    LRU cache with budget: sum of sizes of values (sizeof(value), 1 by default) is at most capacity,
+    the least recently used values are evicted first
+    """
+
+    def __init__(self, capacity, sizeof=None):
+        self.capacity = capacity
+        self.sizeof = sizeof or (lambda value: 1)
+        self.data = OrderedDict()  # key - (value, size)
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        if key not in self.data:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.data.move_to_end(key)
+        return self.data[key][0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.capacity:
+            return
+        if key in self.data:
+            self.used -= self.data.pop(key)[1]
+        while self.used + size > self.capacity:
+            self.used -= self.data.popitem(last=False)[1][1]
+        self.data[key] = (value, size)
+        self.used += size
+
+    def clear(self):
+        self.data.clear()
+        self.used = 0
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / requests, 3) if requests else 0,
+            'items': len(self.data),
+            'used': self.used,
+            'capacity': self.capacity,
+        }
+
+
+class MemoPostingList:
+    """
+    PostingList which keeps decoded blocks of docIDs and term frequencies,
+    nbytes is upper bound of memory for all of them, so it does not change while blocks are decoded
+    """
+
+    def __init__(self, postings, block_size=128):
+        self.postings = postings
+        self.last_docs = postings.last_docs
+        self.is_bitmap = postings.is_bitmap
+        self.nbytes = len(postings) * (16 * block_size + 64)
+        self._blocks = {}
+        self._tfs = {}
+
+    def __len__(self):
+        return len(self.postings)
+
+    def find_block(self, docID, start=0):
+        return self.postings.find_block(docID, start)
+
+    def block(self, i):
+        if i not in self._blocks:
+            self._blocks[i] = self.postings.block(i)
+        return self._blocks[i]
+
+    def to_bitmap(self, start, n_words):
+        return self.postings.to_bitmap(start, n_words)
+
+    def block_tfs(self, i):
+        if i not in self._tfs:
+            self._tfs[i] = self.postings.block_tfs(i)
+        return self._tfs[i]
+
+    def block_positions(self, i):
+        return self.postings.block_positions(i)
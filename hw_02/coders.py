@@ -0,0 +1,375 @@
+import json
+from bisect import bisect_left
+import numpy as np
+
+
+class JustCoder:
+
+    def encode(self, data):
+        return json.dumps(data).encode('utf-8')
+
+    def decode(self, data):
+        return json.loads(data.decode('utf-8'))
+
+
+def bit_length(data):
+    """Vectorized int.bit_length for array of non-negative ints < 2**53"""
+    return np.frexp(data.astype(np.float64))[1]
+
+
+def gallop(data, value, lo=0):
+    """Exponential + binary search: first position since lo with data[pos] >= value"""
+    size = len(data)
+    hi = lo
+    step = 1
+    while hi < size and data[hi] < value:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(data, value, lo, min(hi, size))
+
+
+SIMPLE9_CODES = {
+    # code: [count, shift, max_value]
+    0x8: [28, 1, 2**1 - 1],
+    0x7: [14, 2, 2**2 - 1],
+    0x6: [9, 3, 2**3 - 1],
+    0x5: [7, 4, 2**4 - 1],
+    0x4: [5, 5, 2**5 - 1],
+    0x3: [4, 7, 2**7 - 1],
+    0x2: [3, 9, 2**9 - 1],
+    0x1: [2, 14, 2**14 - 1],
+    0x0: [1, 28, 2**28 - 1],
+}
+
+
+class Simple9Coder:
+    """
+    Simple9: each uint32 word is 4 bits of selector and 28 bits of payload
+
+    Selectors are tried from the densest one, encode and decode work with whole numpy arrays
+    """
+
+    codes_info = SIMPLE9_CODES
+    codes = np.array(list(SIMPLE9_CODES.keys()), dtype=np.uint32)
+    counts = np.array([SIMPLE9_CODES.get(code, [0])[0] for code in range(16)], dtype=np.int64)
+    shifts = np.array([SIMPLE9_CODES.get(code, [0, 0])[1] for code in range(16)], dtype=np.int64)
+    masks = np.array([SIMPLE9_CODES.get(code, [0, 0, 0])[2] for code in range(16)], dtype=np.uint32)
+    small_size = 64
+
+    def encode(self, data):
+        data = np.asarray(data, dtype=np.uint32)
+        data_size = len(data)
+        if data_size == 0:
+            return b''
+        if data.max() > 2**28 - 1:
+            raise ValueError("Simple9 can encode only values less than 2**28")
+        if data_size < self.small_size:
+            return self.encode_small(data.tolist())
+
+        # fits[k, pos] - can code k pack data[pos:pos + count]
+        bits = bit_length(data)
+        fits = np.zeros((len(self.codes), data_size), dtype=bool)
+        for k, code in enumerate(self.codes):
+            count, shift, _ = self.codes_info[code]
+            if count > data_size:
+                continue
+            too_big = np.concatenate(([0], np.cumsum(bits > shift)))
+            fits[k, :data_size - count + 1] = too_big[count:] == too_big[:-count]
+        choice = self.codes[fits.argmax(axis=0)].tolist()
+
+        starts = []
+        selectors = []
+        curret_pos = 0
+        while curret_pos < data_size:
+            code = choice[curret_pos]
+            starts.append(curret_pos)
+            selectors.append(code)
+            curret_pos += self.codes_info[code][0]
+
+        starts = np.array(starts, dtype=np.int64)
+        selectors = np.array(selectors, dtype=np.uint32)
+        result = selectors << np.uint32(28)
+        for code in np.unique(selectors):
+            count, shift, _ = self.codes_info[code]
+            words = selectors == code
+            items = data[starts[words, None] + np.arange(count)]
+            items <<= (np.arange(count, dtype=np.uint32) * np.uint32(shift))
+            result[words] |= np.bitwise_or.reduce(items, axis=1)
+
+        return result.astype('<u4').tobytes()
+
+    def encode_small(self, data):
+        """The same greedy packing in pure python: numpy overhead is bigger than the work for short lists"""
+        result = []
+        data_size = len(data)
+        curret_pos = 0
+        while curret_pos < data_size:
+            for code, (count, shift, max_value) in self.codes_info.items():
+                items = data[curret_pos:curret_pos + count]
+                if curret_pos + count <= data_size and max(items) <= max_value:
+                    word = code << 28
+                    for i, item in enumerate(items):
+                        word |= item << (i * shift)
+                    result.append(word)
+                    curret_pos += count
+                    break
+        return np.array(result, dtype='<u4').tobytes()
+
+    def decode(self, data):
+        words = np.frombuffer(data, dtype='<u4').astype(np.uint32)
+        selectors = words >> np.uint32(28)
+        counts = self.counts[selectors]
+
+        word_idx = np.repeat(np.arange(len(words)), counts)
+        starts = np.cumsum(counts) - counts
+        item_idx = np.arange(len(word_idx)) - starts[word_idx]
+
+        selectors = selectors[word_idx]
+        shifts = (self.shifts[selectors] * item_idx).astype(np.uint32)
+        return ((words[word_idx] & np.uint32(0x0fffffff)) >> shifts) & self.masks[selectors]
+
+
+class VarByteCoder:
+    """VarByte: 7 bits of value per byte, high bit marks the last byte of value"""
+
+    def encode(self, data):
+        data = np.asarray(data, dtype=np.uint64)
+        sizes = np.maximum(1, (bit_length(data) + 6) // 7)
+        ends = np.cumsum(sizes)
+
+        result = np.zeros(ends[-1] if len(ends) else 0, dtype=np.uint8)
+        for k in range(sizes.max(initial=0)):
+            # k-th byte from the end of each value
+            values = sizes > k
+            result[ends[values] - 1 - k] = (data[values] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        result[ends - 1] |= 0x80
+        return result.tobytes()
+
+    def decode(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        if len(data) == 0:
+            return np.zeros(0, dtype=np.uint32)
+        ends = np.flatnonzero(data & 0x80)
+        value_idx = np.concatenate(([0], np.cumsum(data[:-1] >> 7, dtype=np.int64)))
+        shifts = (7 * (ends[value_idx] - np.arange(len(data)))).astype(np.uint64)
+        items = (data & 0x7f).astype(np.uint64) << shifts
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        return np.add.reduceat(items, starts).astype(np.uint32)
+
+
+def d_gaps(data):
+    gaps = data.copy()
+    gaps[1:] -= data[:-1]
+    return gaps
+
+
+def positions_gaps(tfs, positions):
+    """Positions of each document as d-gaps, the first position of document is kept as is"""
+    gaps = d_gaps(positions)
+    starts = np.cumsum(tfs) - tfs
+    gaps[starts] = positions[starts]
+    return gaps
+
+
+class RawCoder:
+    """
+    Posting list without compression, for temporary segments
+
+    Layout (uint32 words): docs count, docIDs, term frequencies; positions are stored as is
+    """
+
+    def encode(self, data, tfs=None, positions=None):
+        tfs = np.ones(len(data), dtype=np.int64) if tfs is None else tfs
+        words = np.concatenate(([len(data)], data, tfs)).astype('<u4')
+        return words.tobytes(), b'' if positions is None else np.asarray(positions, dtype='<u4').tobytes()
+
+    def decode(self, data):
+        size = int(np.frombuffer(data, dtype='<u4', count=1)[0])
+        return np.frombuffer(data, dtype='<u4', count=size, offset=4).astype(np.int64)
+
+    def decode_all(self, data, positions=b''):
+        """docIDs, term frequencies and all positions (None if there are no positions)"""
+        size = int(np.frombuffer(data, dtype='<u4', count=1)[0])
+        words = np.frombuffer(data, dtype='<u4', count=2 * size, offset=4).astype(np.int64)
+        positions = np.frombuffer(positions, dtype='<u4').astype(np.int64) if len(positions) else None
+        return words[:size], words[size:], positions
+
+
+BITMAP_FLAG = 0x80000000
+
+
+def docs_to_bitmap(docs, start, n_words):
+    """Bitmap of docIDs in [start, start + 64 * n_words) as uint64 words, bit j of the word k is docID start + 64k + j"""
+    docs = np.asarray(docs, dtype=np.int64) - start
+    docs = docs[(docs >= 0) & (docs < 64 * n_words)]
+    words = np.zeros(n_words, dtype=np.uint64)
+    np.bitwise_or.at(words, docs >> 6, np.left_shift(np.uint64(1), (docs & 63).astype(np.uint64)))
+    return words
+
+
+def bitmap_to_docs(words, start):
+    return np.flatnonzero(np.unpackbits(words.astype('<u8').view(np.uint8), bitorder='little')) + start
+
+
+class PostingList:
+    """
+    Posting list encoded by BlockCoder
+
+    Any block can be decoded alone: skip entry (last docID, byte offsets) is stored for every block,
+    term frequencies and positions of the block are decoded only when they are requested.
+    DocIDs of dense list are stored as bitmap, then block is the part of bitmap between last docIDs of blocks
+    """
+
+    def __init__(self, int_coder, data, positions=b''):
+        header = int(np.frombuffer(data, dtype='<u4', count=1)[0])
+        self.size = header & ~BITMAP_FLAG
+        skips = np.frombuffer(data, dtype='<u4', count=4 * self.size, offset=4).astype(np.int64)
+        self.last_docs = skips[:self.size].tolist()
+        self._blocks = data[4 * (1 + 4 * self.size):]
+        self.offsets = np.append(skips[self.size:2 * self.size], len(self._blocks))
+        self.tf_offsets = skips[2 * self.size:3 * self.size]
+        self.pos_offsets = np.append(skips[3 * self.size:], len(positions))
+        self._positions = positions
+        self.int_coder = int_coder
+
+        self.is_bitmap = bool(header & BITMAP_FLAG)
+        if self.is_bitmap:
+            self.base, n_words = np.frombuffer(self._blocks, dtype='<u4', count=2).tolist()
+            self.bitmap = np.frombuffer(self._blocks, dtype='<u8', count=n_words, offset=8)
+
+    def __len__(self):
+        return self.size
+
+    def find_block(self, docID, start=0):
+        """First block since start with last docID >= docID, len(self) if there is no such block"""
+        return gallop(self.last_docs, docID, start)
+
+    def block(self, i):
+        if self.is_bitmap:
+            start = self.last_docs[i - 1] + 1 if i > 0 else self.base
+            first_word, last_word = (start - self.base) // 64, (self.last_docs[i] - self.base) // 64
+            docs = bitmap_to_docs(self.bitmap[first_word:last_word + 1], self.base + 64 * first_word)
+            return docs[(docs >= start) & (docs <= self.last_docs[i])]
+        gaps = self.int_coder.decode(self._blocks[self.offsets[i]:self.tf_offsets[i]])
+        base = self.last_docs[i - 1] if i > 0 else 0
+        return np.cumsum(gaps, dtype=np.int64) + base
+
+    def to_bitmap(self, start, n_words):
+        """DocIDs in [start, start + 64 * n_words) as bitmap, start is multiple of 64"""
+        if not self.is_bitmap:
+            return docs_to_bitmap(self.decode(), start, n_words)
+        words = np.zeros(n_words, dtype=np.uint64)
+        shift = (self.base - start) // 64
+        begin, end = max(0, shift), min(n_words, shift + len(self.bitmap))
+        if begin < end:
+            words[begin:end] = self.bitmap[begin - shift:end - shift]
+        return words
+
+    def block_tfs(self, i):
+        return self.int_coder.decode(self._blocks[self.tf_offsets[i]:self.offsets[i + 1]]).astype(np.int64) + 1
+
+    def block_positions(self, i):
+        """All positions of the block (sorted by docID and position) and term frequencies of its documents"""
+        if len(self._positions) == 0:
+            raise RuntimeError("Index is built without positions")
+        tfs = self.block_tfs(i)
+        gaps = self.int_coder.decode(self._positions[self.pos_offsets[i]:self.pos_offsets[i + 1]])
+        positions = np.cumsum(gaps, dtype=np.int64)
+        # cumsum runs through the whole block, subtract sums of the previous documents
+        ends = np.cumsum(tfs)
+        before = np.concatenate(([0], positions[ends[:-1] - 1]))
+        return positions - np.repeat(before, tfs), tfs
+
+    def decode(self):
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.is_bitmap:
+            return bitmap_to_docs(self.bitmap, self.base)
+        return np.concatenate([self.block(i) for i in range(self.size)])
+
+    def decode_tfs(self):
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self.block_tfs(i) for i in range(self.size)])
+
+    def decode_positions(self):
+        if self.size == 0 or len(self._positions) == 0:
+            return None
+        return np.concatenate([self.block_positions(i)[0] for i in range(self.size)])
+
+
+class BlockCoder:
+    """
+    Posting list coder: docIDs are split into blocks, stored as d-gaps and packed with IntCoder,
+    after docIDs of the block go its term frequencies - 1
+
+    Layout (uint32 words): blocks count, last docID of each block, byte offset of each block,
+    byte offset of term frequencies of each block, byte offset of positions of each block, packed blocks
+
+    Positions are written to separate stream: d-gaps inside document, packed with IntCoder by blocks
+
+    Dense list (at least block_size docIDs and at least 1/bitmap_density of its docID range, as in Roaring)
+    stores docIDs as bitmap instead of d-gaps: base docID and count of words, then uint64 words,
+    it is marked by high bit of blocks count, skips and term frequencies are the same
+    """
+
+    def __init__(self, IntCoder=Simple9Coder, block_size=128, bitmap_density=16):
+        self.int_coder = IntCoder()
+        self.block_size = block_size
+        self.bitmap_density = bitmap_density
+
+    def encode(self, data, tfs=None, positions=None):
+        data = np.asarray(data, dtype=np.int64)
+        tfs = np.ones(len(data), dtype=np.int64) if tfs is None else np.asarray(tfs, dtype=np.int64)
+        # d-gaps of the whole list: the first gap of block is taken from the last docID of previous block
+        gaps = d_gaps(data)
+        pos_starts = np.concatenate(([0], np.cumsum(tfs)))
+        if positions is not None:
+            positions = positions_gaps(tfs, np.asarray(positions, dtype=np.int64))
+        blocks = []
+        positions_blocks = []
+        last_docs = []
+        offsets = []
+        tf_offsets = []
+        pos_offsets = []
+        offset = 0
+        pos_offset = 0
+
+        is_bitmap = len(data) >= self.block_size and len(data) * self.bitmap_density >= data[-1] - data[0] + 1
+        if is_bitmap:
+            base = data[0] // 64 * 64
+            words = docs_to_bitmap(data, base, (data[-1] - base) // 64 + 1)
+            blocks.append(np.array([base, len(words)], dtype='<u4').tobytes() + words.astype('<u8').tobytes())
+            offset = len(blocks[0])
+
+        for start in range(0, len(data), self.block_size):
+            end = start + self.block_size
+            packed = b'' if is_bitmap else self.int_coder.encode(gaps[start:end])
+            packed_tfs = self.int_coder.encode(tfs[start:end] - 1)
+            blocks.extend((packed, packed_tfs))
+            last_docs.append(int(data[min(end, len(data)) - 1]))
+            offsets.append(offset)
+            tf_offsets.append(offset + len(packed))
+            offset += len(packed) + len(packed_tfs)
+
+            pos_offsets.append(pos_offset)
+            if positions is not None:
+                packed = self.int_coder.encode(positions[pos_starts[start]:pos_starts[min(end, len(data))]])
+                positions_blocks.append(packed)
+                pos_offset += len(packed)
+
+        size = len(last_docs) | (BITMAP_FLAG if is_bitmap else 0)
+        header = np.array([size] + last_docs + offsets + tf_offsets + pos_offsets, dtype='<u4').tobytes()
+        return header + b''.join(blocks), b''.join(positions_blocks)
+
+    def postings(self, data, positions=b''):
+        return PostingList(self.int_coder, data, positions)
+
+    def decode(self, data):
+        return self.postings(data).decode()
+
+    def decode_all(self, data, positions=b''):
+        """docIDs, term frequencies and all positions (None if there are no positions)"""
+        postings = self.postings(data, positions)
+        return postings.decode(), postings.decode_tfs(), postings.decode_positions()
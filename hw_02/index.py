@@ -1,159 +1,66 @@
 import os
+import re
 import gzip
+import codecs
+import heapq
+import shutil
+import struct
+import argparse
+from array import array
 from collections import defaultdict
-import json
-from sys import argv
-
-
-class JustCoder:
-
-    def encode(self, data):
-        return json.dumps(data).encode('utf-8')
-    
-    def decode(self, data):
-        return json.loads(data.decode('utf-8'))
-
-
-class Simple9Coder():
-
-    codes = [
-        0x00000000,
-        0x10000000,
-        0x20000000,
-        0x30000000,
-        0x40000000,
-        0x50000000,
-        0x60000000,
-        0x70000000,
-        0x80000000,
-    ]
-
-    codes_info = {
-        codes[8]: [28, 1, 2**1 - 1],
-        codes[7]: [14, 2, 2**2 - 1],
-        codes[6]: [9, 3, 2**3 - 1],
-        codes[5]: [7, 4, 2**4 - 1],
-        codes[4]: [5, 5, 2**5 - 1],
-        codes[3]: [4, 7, 2**7 - 1],
-        codes[2]: [3, 9, 2**9 - 1],
-        codes[1]: [2, 14, 2**14 - 1],
-        codes[0]: [1, 28, 2**28 - 1],
-    }
-        
-    def encode(self, data):
-        curret_pos = 0        
-        result = []
-        data_size = len(data)
-
-        while curret_pos < data_size:        
-            for code, code_info in self.codes_info.items():
-                count = code_info[0]
-                shift = code_info[1]
-                max_value = code_info[2]
-
-                current_max_value = max(data[curret_pos:curret_pos + count])
-
-                if current_max_value < max_value and curret_pos + count <= data_size:
-                    tmp = data[curret_pos] | code
-                    for i in range(count - 1):
-                        tmp |= (data[curret_pos + i + 1] << (shift * (i + 1)))
-                    
-                    result.append(str(tmp))
-                    curret_pos += count
-                    break
-
-        return ('\n'.join(result)).encode('utf-8')
-
-    def decode(self, data):
-        data = data.decode('utf-8')
-
-        result = []
-        for num in data.split():
-            num = int(num)
-
-            code = num & 0xf0000000
-            code_info = self.codes_info[code]
-            num = num & 0x0fffffff
-
-            count = code_info[0]
-            shift = code_info[1]
-            mask = code_info[2]
-
-            for i in range(count):
-                result.append(num & mask)            
-                num >>= shift
-
-        return result
-
-
-def save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID, StringCoder=JustCoder, IntCoder=Simple9Coder, dirname='load_data'):
+from itertools import groupby
+from multiprocessing import Pool
+from sys import getsizeof
+
+import numpy as np
+
+from coders import Simple9Coder, VarByteCoder, BlockCoder, RawCoder
+from segment import Segment, MultiSegment
+from lexicon import Lexicon, UrlTable, UrlIndex
+from tokenizer import Tokenizer
+
+
+def save_dicts(docID_to_url, word_to_ID, dirname='load_data'):
+    """docID - url is saved as url table (url - docID is its inverse), word - wordID as front-coded lexicon"""
     if not os.path.exists(dirname):
         os.mkdir(dirname)
 
-    string_coder = StringCoder()
-    int_coder = IntCoder()
-
-    with gzip.open(f"{dirname}/docID_to_url.dump.gz", "w") as f:
-        f.write(string_coder.encode(docID_to_url))
-    with gzip.open(f"{dirname}/url_to_docID.dump.gz", "w") as f:
-        f.write(string_coder.encode(url_to_docID))
-    with gzip.open(f"{dirname}/word_to_ID.dump.gz", "w") as f:
-        f.write(string_coder.encode(word_to_ID))
-
-    
-    prepared_index = []
-    for key, value in reversed_index.items():
-        batch = [key] + [len(value)] + value
-        prepared_index.extend(batch)
-
-    with gzip.open(f"{dirname}/reversed_index.dump.gz", "w") as f:
-        f.write(int_coder.encode(prepared_index))
-
-
-def load_data(StringCoder=JustCoder, IntCoder=Simple9Coder, dirname='load_data'):
-    string_coder = StringCoder()
-    int_coder = IntCoder()
-
-    with gzip.open(f"{dirname}/docID_to_url.dump.gz", "r") as f:
-        data = string_coder.decode(f.read())
-        docID_to_url = {int(key) : value for key, value in data.items()}
-    with gzip.open(f"{dirname}/url_to_docID.dump.gz", "r") as f:
-        data = string_coder.decode(f.read())
-        url_to_docID = {key : int(value) for key, value in data.items()}
-    with gzip.open(f"{dirname}/word_to_ID.dump.gz", "r") as f:
-        data = string_coder.decode(f.read())
-        word_to_ID = {key : int(value) for key, value in data.items()}
-
-    with gzip.open(f"{dirname}/reversed_index.dump.gz", "r") as f:
-        prepared_index = int_coder.decode(f.read())
-
-    state  = 0
-    reversed_index = defaultdict(list)
-
-    for elem in prepared_index:
-        if state == 0:
-            key = elem
-            state = 1
-        elif state == 1:
-            data_size = elem
-            current_data = []
-            state = 2
-        elif state == 2:
-            current_data.append(elem)
-            if len(current_data) == data_size:
-                state = 0 
-                reversed_index[key] = current_data
-                current_data = []
-    
-    return reversed_index, docID_to_url, url_to_docID, word_to_ID
+    UrlTable.write(docID_to_url, dirname)
+    Lexicon.write(word_to_ID, dirname)
+
+
+def save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID, IntCoder=BlockCoder, dirname='load_data'):
+    save_dicts(docID_to_url, word_to_ID, dirname)
+    # reversed_index has docID for every occurrence of word, so length of document is count of its docID
+    doc_lengths = np.zeros(len(docID_to_url), dtype=np.int64)
+    for value in reversed_index.values():
+        doc_lengths += np.bincount(value, minlength=len(docID_to_url))
+    doc_lengths.astype('<u4').tofile(f"{dirname}/{MultiSegment.DOC_LENGTHS}")
+    items = ((key, value, None) for key, value in sorted(reversed_index.items()))
+    Segment.write(items, IntCoder, dirname, doc_lengths=doc_lengths, avgdl=doc_lengths.mean())
+    deleted = np.zeros(len(docID_to_url), dtype=bool)
+    MultiSegment.write(dirname, [('reversed_index', 0, len(docID_to_url) - 1)], deleted, 1)
+
 
+def load_dicts(dirname='load_data'):
+    """Read-only dictionaries on mmap: docID - url, url - docID, word - wordID"""
+    docID_to_url = UrlTable(dirname)
+    word_to_ID = Lexicon(dirname)
 
-def check_save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID):
-    save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID)
+    return docID_to_url, UrlIndex(docID_to_url), word_to_ID
 
-    new_reversed_index, new_docID_to_url, new_url_to_docID, new_word_to_ID = load_data()
 
-    assert new_reversed_index == reversed_index
+def load_data(IntCoder=BlockCoder, dirname='load_data'):
+    docID_to_url, url_to_docID, word_to_ID = load_dicts(dirname)
+    reversed_index = MultiSegment(IntCoder, dirname)
+
+    return reversed_index, docID_to_url, url_to_docID, word_to_ID
+
+
+def check_save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID, dirname='load_data'):
+    new_reversed_index, new_docID_to_url, new_url_to_docID, new_word_to_ID = load_data(dirname=dirname)
+
+    assert dict(new_reversed_index.items()) == {key: value for key, value in reversed_index.items() if value}
     assert new_docID_to_url == docID_to_url
     assert new_url_to_docID == url_to_docID
     assert new_word_to_ID == word_to_ID
@@ -161,58 +68,390 @@ def check_save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID):
     print("Tests OK")
 
 
-def index_sh(dirname, test=False):
-    dumps = os.listdir(dirname)
-
-    dirty_words = ""
-    for filename in dumps:
-        with gzip.open(dirname + filename) as f:
-            dirty_words += f.read().decode("utf-8", errors="ignore").lower() + ' '
-    
-    clean_words = ""
-    for i, c in enumerate(dirty_words):
-        if ord(c) > 32:
-            clean_words += c
-        else:
-            clean_words += ' '
-    clean_words = clean_words.split()
-
-    words_set = set(clean_words) # Set of all words
-    one_site = []
-    sites_index = {} # site - site's content
-    for word in clean_words:
-        if 'http://lenta.ru/' in word:
-            if len(one_site) > 3:
-                adr = one_site[0]
-                while adr[:4] != 'http':
-                    adr = adr[1:]
-                sites_index[adr] = one_site[1:]
-                words_set.remove(one_site[0])
-            one_site = []
-        one_site.append(word)
-
-    word_to_ID = {word: i for i, word in enumerate(words_set)} # word - wordID
-    url_to_docID = {url: i for i, url in enumerate(sites_index.keys())} # site's url - docID
-    docID_to_url = {i: url for i, url in enumerate(sites_index.keys())} # docID - site's url
-    reversed_index = defaultdict(list) # wordID - docID
-
-    for i, (url, words) in enumerate(sites_index.items()):
-        for word in words:
-            reversed_index[word_to_ID[word]].append(url_to_docID[url])
-    
+# site starts with its url, url ends at the first symbol with code <= 32
+URL = re.compile(r"http://lenta\.ru/[^\x00-\x20]*", re.IGNORECASE)
+
+
+def read_sites(filename, tokenizer, chunk_size=2**20):
+    """
+    Pairs (url, words) of all sites of gzip dump, file is decompressed by chunks,
+    text of every site is split into words by tokenizer at once
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    text = ''
+    with gzip.open(filename) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            text += decoder.decode(chunk, final=not chunk)
+            starts = list(URL.finditer(text))
+            # the last site (and even its url) may continue in the next chunk
+            for start, end in zip(starts, starts[1:] + ([None] if not chunk else [])):
+                words = tokenizer.words(text[start.end():end.start() if end else len(text)])
+                if len(words) > 2:
+                    yield start.group().lower(), words
+            if not chunk:
+                break
+            if starts:
+                text = text[starts[-1].start():]
+
+
+def write_run(filename, buffer):
+    """Sorted run: for each word - length of word, word, count of occurrences, pairs (docID, position)"""
+    with open(filename, 'wb') as f:
+        for word in sorted(buffer):
+            word_bytes = word.encode('utf-8')
+            occurrences = buffer[word]
+            f.write(struct.pack('<I', len(word_bytes)) + word_bytes + struct.pack('<I', len(occurrences) // 2))
+            occurrences.tofile(f)
+
+
+def read_run(filename):
+    with open(filename, 'rb') as f:
+        while True:
+            size = f.read(4)
+            if not size:
+                break
+            word = f.read(struct.unpack('<I', size)[0]).decode('utf-8')
+            count = struct.unpack('<I', f.read(4))[0]
+            occurrences = array('I')
+            occurrences.fromfile(f, 2 * count)
+            yield word, occurrences
+
+
+def merge_runs(runs, word_to_ID, positions=True):
+    """K-way merge of sorted runs, wordIDs are given in sorted order of words"""
+    merged = heapq.merge(*[read_run(run) for run in runs], key=lambda elem: elem[0])
+    for word_id, (word, group) in enumerate(groupby(merged, key=lambda elem: elem[0])):
+        word_to_ID[word] = word_id
+        occurrences = array('I')
+        for _, run_occurrences in group:
+            occurrences.extend(run_occurrences)
+        occurrences = np.frombuffer(occurrences, dtype=np.uint32).reshape(-1, 2)
+        yield word_id, occurrences[:, 0], occurrences[:, 1] if positions else None
+
+
+def spimi(filenames, save_dirname, memory_limit, IntCoder=BlockCoder, positions=True, tokenizer=None):
+    """
+    SPIMI: postings (docID, position of word in document) are collected in memory until buffer reaches
+    memory_limit (MB), then buffer is flushed as sorted run and all runs are merged into segment at the end
+    """
+    tokenizer = tokenizer or Tokenizer()
+    runs_dirname = f"{save_dirname}/runs"
+    os.makedirs(runs_dirname, exist_ok=True)
+
+    runs = []
+    buffer = defaultdict(lambda: array('I'))  # word - pairs (docID, position)
+    buffer_size = 0
+    url_to_docID = {}  # site's url - docID
+    docID_to_url = {}  # docID - site's url
+    doc_lengths = array('I')  # docID - count of words
+
+    for filename in filenames:
+        for url, words in read_sites(filename, tokenizer):
+            if url in url_to_docID:
+                continue
+            doc_id = len(url_to_docID)
+            url_to_docID[url] = doc_id
+            docID_to_url[doc_id] = url
+            doc_lengths.append(len(words))
+
+            for position, word in enumerate(words):
+                if word not in buffer:
+                    buffer_size += getsizeof(word) + 200
+                buffer[word].extend((doc_id, position))
+            buffer_size += 8 * len(words)
+
+            if buffer_size > memory_limit * 2**20:
+                runs.append(f"{runs_dirname}/run_{len(runs)}")
+                write_run(runs[-1], buffer)
+                buffer.clear()
+                buffer_size = 0
+
+    if buffer:
+        runs.append(f"{runs_dirname}/run_{len(runs)}")
+        write_run(runs[-1], buffer)
+        buffer.clear()
+
+    word_to_ID = {}  # word - wordID
+    doc_lengths = np.array(doc_lengths, dtype=np.int64)
+    doc_lengths.astype('<u4').tofile(f"{save_dirname}/{MultiSegment.DOC_LENGTHS}")
+    avgdl = doc_lengths.mean() if len(doc_lengths) else 0
+    Segment.write(merge_runs(runs, word_to_ID, positions), IntCoder, save_dirname, doc_lengths=doc_lengths, avgdl=avgdl)
+    save_dicts(docID_to_url, word_to_ID, dirname=save_dirname)
+    shutil.rmtree(runs_dirname)
+    return len(docID_to_url)
+
+
+def spimi_part(args):
+    """Index part of dumps into temporary segment with local IDs"""
+    filenames, save_dirname, memory_limit, positions, tokenizer = args
+    spimi(filenames, save_dirname, memory_limit, RawCoder, positions, tokenizer)
+    return save_dirname
+
+
+def concat_occurrences(occurrences):
+    """Concatenate pairs (docIDs, positions) of posting lists, positions are None if some list has no positions"""
+    docs = np.concatenate([np.zeros(0, dtype=np.int64)] + [docs for docs, _ in occurrences])
+    if any(positions is None for _, positions in occurrences):
+        return docs, None
+    return docs, np.concatenate([np.zeros(0, dtype=np.int64)] + [positions for _, positions in occurrences])
+
+
+def filter_occurrences(docs, positions, mask):
+    return docs[mask], None if positions is None else positions[mask]
+
+
+def merge_segments(dirnames, save_dirname, pool=None):
+    """
+    Merge temporary segments with local IDs into one segment: docIDs are given in order of segments
+    (url which is already indexed is skipped), words are merged by k-way merge and get IDs in sorted order
+    """
+    parts = [(Segment(RawCoder, dirname),) + load_dicts(dirname=dirname) for dirname in dirnames]
+
+    url_to_docID = {}
+    docID_to_url = {}
+    doc_maps = []  # local docID - global docID, -1 for skipped urls
+    doc_lengths = []
+    for part, (_, part_docID_to_url, _, _) in zip(dirnames, parts):
+        doc_map = np.full(len(part_docID_to_url), -1, dtype=np.int64)
+        for local_id, url in part_docID_to_url.items():
+            if url not in url_to_docID:
+                doc_id = len(url_to_docID)
+                url_to_docID[url] = doc_id
+                docID_to_url[doc_id] = url
+                doc_map[local_id] = doc_id
+        doc_maps.append(doc_map)
+        part_doc_lengths = np.fromfile(f"{part}/{MultiSegment.DOC_LENGTHS}", dtype='<u4').astype(np.int64)
+        doc_lengths.append(part_doc_lengths[doc_map >= 0])
+    doc_lengths = np.concatenate(doc_lengths)
+    doc_lengths.astype('<u4').tofile(f"{save_dirname}/{MultiSegment.DOC_LENGTHS}")
+
+    word_to_ID = {}
+
+    def merged_postings():
+        words = heapq.merge(*[
+            [(word, i, local_id) for word, local_id in sorted(part[3].items())]
+            for i, part in enumerate(parts)
+        ])
+        for word, group in groupby(words, key=lambda elem: elem[0]):
+            occurrences = []
+            for _, i, local_id in group:
+                docs, positions = parts[i][0].occurrences(local_id)
+                occurrences.append((doc_maps[i][docs], positions))
+            docs, positions = concat_occurrences(occurrences)
+            if (docs >= 0).any():
+                word_to_ID[word] = len(word_to_ID)
+                yield (word_to_ID[word], *filter_occurrences(docs, positions, docs >= 0))
+
+    Segment.write(merged_postings(), BlockCoder, save_dirname, pool=pool, doc_lengths=doc_lengths, avgdl=doc_lengths.mean())
+    save_dicts(docID_to_url, word_to_ID, dirname=save_dirname)
+    for part in parts:
+        part[0].close()
+    return len(docID_to_url)
+
+
+def remove_segments(dirname, names):
+    for name in names:
+        for ext in ('dict', 'postings', 'positions'):
+            if os.path.exists(f"{dirname}/{name}.{ext}"):
+                os.remove(f"{dirname}/{name}.{ext}")
+
+
+def index_sh(dirname, test=False, memory_limit=256, save_dirname='load_data', workers=1, positions=True, tokenizer=None):
+    """
+    Make index of all dumps of dirname and save it to save_dirname
+
+    With workers > 1 every dump is indexed by its own process into segment with local IDs,
+    then segments are merged and posting lists are encoded by the same processes,
+    result is the same as with one process
+
+    Settings of tokenizer are saved with index, add and search use the same ones
+    """
+    tokenizer = tokenizer or Tokenizer()
+    dumps = [dirname + filename for filename in sorted(os.listdir(dirname))]
+    os.makedirs(save_dirname, exist_ok=True)
+    if os.path.exists(f"{save_dirname}/{MultiSegment.MANIFEST}"):
+        manifest = MultiSegment.read_manifest(save_dirname)
+        remove_segments(save_dirname, [name for name, _, _ in manifest['segments']])
+
+    tokenizer.save(save_dirname)
+    if workers == 1:
+        docs_count = spimi(dumps, save_dirname, memory_limit, positions=positions, tokenizer=tokenizer)
+    else:
+        parts_dirname = f"{save_dirname}/parts"
+        tasks = [(
+            [filename], f"{parts_dirname}/part_{i}", max(1, memory_limit // workers), positions, tokenizer
+        ) for i, filename in enumerate(dumps)]
+        with Pool(workers) as pool:
+            parts = pool.map(spimi_part, tasks, chunksize=1)
+            docs_count = merge_segments(parts, save_dirname, pool)
+        shutil.rmtree(parts_dirname)
+    MultiSegment.write(save_dirname, [('reversed_index', 0, docs_count - 1)], np.zeros(docs_count, dtype=bool), 1)
+
     if test:
-        check_save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID)
-    
-    return reversed_index, docID_to_url, url_to_docID, word_to_ID
+        _, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=save_dirname)
+        reversed_index = defaultdict(list)
+        indexed = set()
+        for filename in dumps:
+            for url, words in read_sites(filename, tokenizer):
+                if url in indexed:
+                    continue
+                indexed.add(url)
+                for word in dict.fromkeys(words):
+                    reversed_index[word_to_ID[word]].append(url_to_docID[url])
+        check_save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID, save_dirname)
+
+    return load_data(dirname=save_dirname)
+
+
+def merge_policy(ranges, merge_factor):
+    """
+    Log merge policy: segment level is log(docs count) by merge_factor,
+    first run of merge_factor neighbour segments of the same level is merged, None if there is no such run
+    """
+    levels = []
+    for first, last in ranges:
+        size, level = last - first + 1, 0
+        while size >= merge_factor:
+            size //= merge_factor
+            level += 1
+        levels.append(level)
+    for start in range(len(levels) - merge_factor + 1):
+        if len(set(levels[start:start + merge_factor])) == 1:
+            return start, start + merge_factor
+    return None
+
+
+def compact_sh(save_dirname='load_data', merge_factor=4, full=False):
+    """
+    Merge neighbour segments by merge policy (or all segments with full=True) until nothing to merge,
+    deleted documents are dropped from postings of merged segments, docIDs are not changed
+    """
+    while True:
+        reversed_index = MultiSegment(BlockCoder, save_dirname)
+        ranges = reversed_index.ranges
+        merge = (0, len(ranges)) if full and ranges else merge_policy(ranges, merge_factor)
+        if merge is None:
+            reversed_index.close()
+            return
+
+        start, end = merge
+        segments = reversed_index.segments[start:end]
+        deleted = reversed_index.deleted
+        keys = sorted(set().union(*[segment.keys() for segment in segments]))
+
+        def merged_postings():
+            for key in keys:
+                docs, positions = concat_occurrences([segment.occurrences(key) for segment in segments])
+                yield (key, *filter_occurrences(docs, positions, ~deleted[docs]))
+
+        generation = reversed_index.generation
+        name = f"reversed_index_{generation}"
+        Segment.write(merged_postings(), BlockCoder, save_dirname, name,
+                      doc_lengths=reversed_index.doc_lengths, avgdl=reversed_index.avgdl)
+        manifest = list(zip(reversed_index.names, *zip(*ranges)))
+        manifest[start:end] = [(name, ranges[start][0], ranges[end - 1][1])]
+        MultiSegment.write(save_dirname, manifest, deleted, generation + 1)
+        reversed_index.close()
+        remove_segments(save_dirname, reversed_index.names[start:end])
+        print(f"Merged {end - start} segments into {name}")
+
+        if full:
+            return
+
+
+def add_sh(filenames, save_dirname='load_data', memory_limit=256, merge_factor=4, positions=True):
+    """
+    Add dumps to the index without rebuild: new documents and words get next IDs,
+    postings are written to new immutable segment, old version of re-crawled url is marked as deleted
+    """
+    reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=save_dirname)
+    reversed_index.close()
+    docID_to_url, url_to_docID, word_to_ID = dict(docID_to_url.items()), dict(url_to_docID.items()), dict(word_to_ID.items())
+    part_dirname = f"{save_dirname}/parts/part_add"
+    spimi(filenames, part_dirname, memory_limit, RawCoder, positions, Tokenizer.load(save_dirname))
+    part = Segment(RawCoder, part_dirname)
+    part_docID_to_url, _, part_word_to_ID = load_dicts(dirname=part_dirname)
+
+    first = reversed_index.max_docID + 1
+    deleted = np.append(reversed_index.deleted, np.zeros(len(part_docID_to_url), dtype=bool))
+    part_doc_lengths = np.fromfile(f"{part_dirname}/{MultiSegment.DOC_LENGTHS}", dtype='<u4').astype(np.int64)
+    doc_lengths = np.append(reversed_index.doc_lengths, part_doc_lengths)
+    for local_id, url in sorted(part_docID_to_url.items()):
+        if url in url_to_docID:
+            deleted[url_to_docID[url]] = True
+            del docID_to_url[url_to_docID[url]]
+        url_to_docID[url] = first + local_id
+        docID_to_url[first + local_id] = url
+
+    for word in sorted(part_word_to_ID):
+        if word not in word_to_ID:
+            word_to_ID[word] = len(word_to_ID)
+    items = sorted((word_to_ID[word], local_id) for word, local_id in part_word_to_ID.items())
+
+    generation = reversed_index.generation
+    manifest = list(zip(reversed_index.names, *zip(*reversed_index.ranges)))
+    if part_docID_to_url:
+        name = f"reversed_index_{generation}"
+        occurrences = ((key, *part.occurrences(local_id)) for key, local_id in items)
+        _, avgdl = MultiSegment.live_stats(doc_lengths, deleted)
+        Segment.write(((key, docs + first, positions) for key, docs, positions in occurrences), BlockCoder, save_dirname, name,
+                      doc_lengths=doc_lengths, avgdl=avgdl)
+        manifest.append((name, first, first + len(part_docID_to_url) - 1))
+    part.close()
+    shutil.rmtree(f"{save_dirname}/parts")
+
+    save_dicts(docID_to_url, word_to_ID, dirname=save_dirname)
+    doc_lengths.astype('<u4').tofile(f"{save_dirname}/{MultiSegment.DOC_LENGTHS}")
+    MultiSegment.write(save_dirname, manifest, deleted, generation + 1)
+    print(f"Added {len(part_docID_to_url)} documents")
+
+    compact_sh(save_dirname, merge_factor)
+
+
+def delete_sh(urls, save_dirname='load_data'):
+    """Mark documents as deleted in tombstone bitmap, postings are dropped by compaction"""
+    reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=save_dirname)
+    reversed_index.close()
+    docID_to_url, url_to_docID = dict(docID_to_url.items()), dict(url_to_docID.items())
+    deleted = reversed_index.deleted
+    for url in urls:
+        if url in url_to_docID:
+            deleted[url_to_docID[url]] = True
+            del docID_to_url[url_to_docID.pop(url)]
+    save_dicts(docID_to_url, word_to_ID, dirname=save_dirname)
+    MultiSegment.write(save_dirname, list(zip(reversed_index.names, *zip(*reversed_index.ranges))),
+                       deleted, reversed_index.generation)
 
 
 if __name__ == '__main__':
-    dirname = argv[1] if len(argv) > 1 else 'dumps/'
-    if dirname[-1] != '/':
-        dirname += '/'
-    print("Making index...")
-    reversed_index, docID_to_url, url_to_docID, word_to_ID = index_sh(dirname)
-    print("Index done, saving...")
-    save_data(reversed_index, docID_to_url, url_to_docID, word_to_ID)
-    print("Saved")
-    
+    parser = argparse.ArgumentParser(
+        description="Make reversed index of dumps",
+        usage="%(prog)s [dirname] | add dump [dump ...] | delete url [url ...] | compact [--full]",
+    )
+    parser.add_argument('args', nargs='*', default=['dumps/'], help="path to dumps or command with its arguments")
+    parser.add_argument('--memory', type=int, default=256, help="memory limit for postings buffer, MB")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes, every dump is indexed separately")
+    parser.add_argument('--merge-factor', type=int, default=4, help="number of segments of the same size to merge")
+    parser.add_argument('--full', action='store_true', help="compact: merge all segments into one")
+    parser.add_argument('--no-positions', action='store_true', help="do not store positions of words")
+    parser.add_argument('--lemmatize', action='store_true', help="index lemmas of words (needs pymorphy2)")
+    parser.add_argument('--keep-letters', action='store_true', help="do not replace ё by е and other letters")
+    args = parser.parse_args()
+    command, params = args.args[0], args.args[1:]
+
+    if command == 'add':
+        add_sh(params, memory_limit=args.memory, merge_factor=args.merge_factor, positions=not args.no_positions)
+    elif command == 'delete':
+        delete_sh(params)
+    elif command == 'compact':
+        compact_sh(merge_factor=args.merge_factor, full=args.full)
+    else:
+        dirname = command
+        if dirname[-1] != '/':
+            dirname += '/'
+        print("Making index...")
+        tokenizer = Tokenizer(normalize_letters=not args.keep_letters, lemmatize=args.lemmatize)
+        index_sh(dirname, memory_limit=args.memory, workers=args.workers, positions=not args.no_positions,
+                 tokenizer=tokenizer)
+        print("Saved")
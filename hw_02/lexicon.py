@@ -0,0 +1,266 @@
+import os
+import re
+import mmap
+import struct
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+
+
+def encode_varint(value):
+    result = bytearray()
+    while value >= 128:
+        result.append(value & 127 | 128)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+
+def decode_varint(data, pos):
+    """Value and position after it"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 127) << shift
+        if byte < 128:
+            return value, pos
+        shift += 7
+
+
+def open_mmap(filename):
+    with open(filename, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def replace_file(filename, data):
+    """File is written next to the old one and replaced, so processes which mmap the old file can still read it"""
+    with open(f"{filename}.tmp", 'wb') as f:
+        f.write(data)
+    os.replace(f"{filename}.tmp", filename)
+
+
+class Lexicon(Mapping):
+    """
+    Read-only dictionary word - wordID, stored as sorted front-coded blocks in {name}.lex
+
+    File: header (magic, count of words, block size, count of blocks), byte offsets of blocks (uint32),
+    wordIDs in sorted order of words (uint32), blocks. Every word of block is (length of common prefix
+    with the previous word, length of suffix, suffix) in utf-8, the first word of block is stored in full.
+    Words are sorted by code points, which is the same as order of their utf-8 bytes
+
+    Lookup is binary search by the first words of blocks and decoding of one block, O(log n)
+    """
+
+    MAGIC = b'LEX1'
+    HEADER = struct.Struct('<4sIII')
+
+    def __init__(self, dirname='load_data', name='word_to_ID'):
+        self._data = open_mmap(f"{dirname}/{name}.lex")
+        magic, self.size, self.block_size, self.n_blocks = self.HEADER.unpack_from(self._data, 0)
+        if magic != self.MAGIC:
+            raise RuntimeError(f"Wrong lexicon format: {dirname}/{name}.lex")
+        self._offsets = struct.unpack_from(f"<{self.n_blocks + 1}I", self._data, self.HEADER.size)
+        self._ids_offset = self.HEADER.size + 4 * (self.n_blocks + 1)
+        self._blocks_offset = self._ids_offset + 4 * self.size
+        # the first words of blocks are kept in memory (every block_size-th word), binary search goes over them
+        self._firsts = [self._first(i) for i in range(self.n_blocks)]
+
+    @classmethod
+    def write(cls, word_to_ID, dirname='load_data', name='word_to_ID', block_size=16):
+        words = sorted(word_to_ID.items())
+        blocks = []
+        offsets = [0]
+        for start in range(0, len(words), block_size):
+            block = bytearray()
+            previous = b''
+            for word, _ in words[start:start + block_size]:
+                word = word.encode('utf-8')
+                common = 0
+                while common < min(len(word), len(previous)) and word[common] == previous[common]:
+                    common += 1
+                block += encode_varint(common) + encode_varint(len(word) - common) + word[common:]
+                previous = word
+            blocks.append(bytes(block))
+            offsets.append(offsets[-1] + len(block))
+
+        header = cls.HEADER.pack(cls.MAGIC, len(words), block_size, len(blocks))
+        ids = struct.pack(f"<{len(words)}I", *[word_id for _, word_id in words])
+        replace_file(f"{dirname}/{name}.lex",
+                     header + struct.pack(f"<{len(offsets)}I", *offsets) + ids + b''.join(blocks))
+
+    def _block(self, i):
+        """Words of block i as utf-8 bytes"""
+        data = self._data[self._blocks_offset + self._offsets[i]:self._blocks_offset + self._offsets[i + 1]]
+        words = []
+        word = b''
+        pos = 0
+        while pos < len(data):
+            common, length = data[pos], data[pos + 1]
+            if common < 128 and length < 128:
+                pos += 2
+            else:
+                common, pos = decode_varint(data, pos)
+                length, pos = decode_varint(data, pos)
+            word = word[:common] + data[pos:pos + length]
+            pos += length
+            words.append(word)
+        return words
+
+    def _first(self, i):
+        pos = self._blocks_offset + self._offsets[i]
+        _, pos = decode_varint(self._data, pos)
+        length, pos = decode_varint(self._data, pos)
+        return self._data[pos:pos + length]
+
+    def _id(self, position):
+        return struct.unpack_from('<I', self._data, self._ids_offset + 4 * position)[0]
+
+    def _find(self, word):
+        """Block where word should be, its words and position of the first word >= word in it"""
+        word = word.encode('utf-8')
+        block = max(0, bisect_right(self._firsts, word) - 1)
+        words = self._block(block)
+        return block, words, bisect_left(words, word)
+
+    def position(self, word):
+        """Position of the first word >= word in sorted order, len(self) if there is no such word"""
+        if self.n_blocks == 0:
+            return 0
+        block, _, i = self._find(word)
+        return block * self.block_size + i
+
+    def __getitem__(self, word):
+        if self.n_blocks > 0:
+            block, words, i = self._find(word)
+            if i < len(words) and words[i] == word.encode('utf-8'):
+                return self._id(block * self.block_size + i)
+        raise KeyError(word)
+
+    def __len__(self):
+        return self.size
+
+    def items(self, start=0):
+        """Pairs (word, wordID) in sorted order of words from position start"""
+        first_block, skip = divmod(start, self.block_size)
+        position = start
+        for block in range(first_block, self.n_blocks):
+            for word in self._block(block)[skip:]:
+                yield word.decode('utf-8'), self._id(position)
+                position += 1
+            skip = 0
+
+    def __iter__(self):
+        for word, _ in self.items():
+            yield word
+
+    def match(self, pattern):
+        """
+        Words matching pattern where '*' is any (possibly empty) string, in sorted order:
+        only words with the prefix of pattern before the first '*' are scanned
+        """
+        prefix = pattern.split('*', 1)[0]
+        regex = re.compile('.*'.join(re.escape(part) for part in pattern.split('*')))
+        words = []
+        for word, _ in self.items(self.position(prefix)):
+            if not word.startswith(prefix):
+                break
+            if regex.fullmatch(word):
+                words.append(word)
+        return words
+
+    def close(self):
+        self._data.close()
+
+
+class UrlTable(Mapping):
+    """
+    Read-only dictionary docID - url, stored in {name}.urls as one blob of urls
+
+    File: header (magic, count of docIDs, count of urls), byte offsets of urls by docID (uint64, count of docIDs + 1),
+    docIDs sorted by url (uint32), blob of utf-8 urls. Deleted docID has empty url.
+    docID - url is O(1), url - docID (find) is binary search by sorted docIDs, O(log n)
+    """
+
+    MAGIC = b'URL1'
+    HEADER = struct.Struct('<4sII')
+
+    def __init__(self, dirname='load_data', name='docID_to_url'):
+        self._data = open_mmap(f"{dirname}/{name}.urls")
+        magic, self.size, self.count = self.HEADER.unpack_from(self._data, 0)
+        if magic != self.MAGIC:
+            raise RuntimeError(f"Wrong url table format: {dirname}/{name}.urls")
+        self._order_offset = self.HEADER.size + 8 * (self.size + 1)
+        self._blob_offset = self._order_offset + 4 * self.count
+
+    @classmethod
+    def write(cls, docID_to_url, dirname='load_data', name='docID_to_url'):
+        size = max(docID_to_url, default=-1) + 1
+        urls = [docID_to_url.get(docID, '').encode('utf-8') for docID in range(size)]
+        offsets = [0]
+        for url in urls:
+            offsets.append(offsets[-1] + len(url))
+        order = sorted((docID for docID in range(size) if urls[docID]), key=lambda docID: urls[docID])
+
+        header = cls.HEADER.pack(cls.MAGIC, size, len(order))
+        replace_file(f"{dirname}/{name}.urls", header + struct.pack(f"<{size + 1}Q", *offsets) +
+                     struct.pack(f"<{len(order)}I", *order) + b''.join(urls))
+
+    def _url(self, docID):
+        """Url of docID as utf-8 bytes, empty for deleted docID"""
+        start, end = struct.unpack_from('<QQ', self._data, self.HEADER.size + 8 * docID)
+        return self._data[self._blob_offset + start:self._blob_offset + end]
+
+    def __getitem__(self, docID):
+        if 0 <= docID < self.size:
+            url = self._url(docID)
+            if url:
+                return url.decode('utf-8')
+        raise KeyError(docID)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for docID in range(self.size):
+            if self._url(docID):
+                yield docID
+
+    def _sorted(self, i):
+        return struct.unpack_from('<I', self._data, self._order_offset + 4 * i)[0]
+
+    def find(self, url):
+        """docID of url, None if there is no such url"""
+        url = url.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._url(self._sorted(mid)) < url:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._url(self._sorted(lo)) == url:
+            return self._sorted(lo)
+        return None
+
+    def close(self):
+        self._data.close()
+
+
+class UrlIndex(Mapping):
+    """Inverse view url - docID of UrlTable"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, url):
+        docID = self.table.find(url)
+        if docID is None:
+            raise KeyError(url)
+        return docID
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        for i in range(self.table.count):
+            yield self.table._url(self.table._sorted(i)).decode('utf-8')
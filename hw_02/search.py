@@ -1,5 +1,72 @@
-from sys import stdin
+import heapq
+from math import log
+from sys import stdin, stderr, argv
 from index import *
+from coders import gallop, docs_to_bitmap, bitmap_to_docs
+from segment import bm25_tf
+from cache import LRUCache, MemoPostingList
+from tokenizer import Tokenizer
+import numpy as np
+
+# caches are created by init_search: decoded posting lists by (segment, wordID) with budget in bytes
+# and answers by normalized query, both are cleared when index is changed on disk
+postings_cache = None
+results_cache = None
+tokenizer = Tokenizer()
+
+
+def get_postings(segment, key):
+    if postings_cache is None:
+        return segment.postings(key)
+    postings = postings_cache.get((segment.name, key))
+    if postings is None:
+        postings = MemoPostingList(segment.postings(key))
+        postings_cache.put((segment.name, key), postings)
+    return postings
+
+
+class PostingCursor:
+    """Cursor over posting list: jumps over blocks by skips and gallops inside the block"""
+
+    def __init__(self, postings):
+        self.postings = postings
+        self.block = 0
+        self.docs = []
+        self.tfs = None
+        self.positions = None
+        self.cur = 0
+        self.touched = 0
+
+    def next_geq(self, docID):
+        """Smallest docID in posting list which is >= docID, inf if there is no such docID"""
+        if self.cur < len(self.docs) and self.docs[self.cur] >= docID:
+            return self.docs[self.cur]
+        if not self.docs or self.docs[-1] < docID:
+            self.block = self.postings.find_block(docID, self.block)
+            if self.block == len(self.postings):
+                self.docs = []
+                return float("inf")
+            self.docs = self.postings.block(self.block).tolist()
+            self.tfs = None
+            self.positions = None
+            self.touched += len(self.docs)
+            self.cur = 0
+        self.cur = gallop(self.docs, docID, self.cur)
+        return self.docs[self.cur]
+
+    def get_tf(self):
+        """Frequency of word in the current document, frequencies are decoded for the whole block"""
+        if self.tfs is None:
+            self.tfs = self.postings.block_tfs(self.block).tolist()
+        return self.tfs[self.cur]
+
+    def get_positions(self):
+        """Positions of word in the current document, positions are decoded for the whole block"""
+        if self.positions is None:
+            positions, tfs = self.postings.block_positions(self.block)
+            self.positions = np.split(positions, np.cumsum(tfs)[:-1])
+        return self.positions[self.cur]
+
 
 class NodeTree:
 
@@ -8,75 +75,160 @@ class NodeTree:
         Parameters
         ----------
         op : string
-            Operand or operation
-        op_type : {'O', 'B', 'U'}
+            Operand (word) or operation, for 'A' - last docID of segment,
+            for 'P' - max distance between words or None for phrase,
+            for 'M' - sorted list of docIDs
+        op_type : {'O', 'A', 'M', 'B', 'U', 'P'}
             O - Operand
-            U - Unary operation
-            B - Binary operation
+            A - All documents
+            M - Materialized result of subtree (evaluated on bitmaps)
+            U - Unary operation: '!'
+            B - Binary operation: '&' and '|' for any number of nodes, '-' - and not
+            P - Positional operation on operands: phrase of any number of words or two words at max distance
         nodes : list
-            List of nodes for operand
+            List of nodes for operand, for 'O' - segment to search in, for 'M' - number of touched postings
         """
         self.op = op
         self.op_type = op_type
+        self.estimate = 0
         if self.op_type == 'O':
+            self.cursor = PostingCursor(get_postings(nodes[0], word_to_ID.get(op, -1)))
+        elif self.op_type == 'A':
+            self.touched = 0
+        elif self.op_type == 'M':
+            self.touched = nodes[0]
             self.cur = 0
-            self.docs = reversed_index[op]
         else:
             self.nodes = nodes
     
-    def run(self, docID):
+    def next_geq(self, docID):
+        """
+        Smallest docID >= docID which matches the node, inf if there is no such docID
+
+        Calls must be made with non-decreasing docID
+        """
         if self.op_type == 'O':
-            while self.cur < len(self.docs) and docID > self.docs[self.cur]:
-                self.cur += 1
-            if self.cur == len(self.docs):
+            return self.cursor.next_geq(docID)
+
+        elif self.op_type == 'A':
+            if docID > self.op:
                 return float("inf")
-            return self.docs[self.cur]
+            self.touched += 1
+            return docID
+
+        elif self.op_type == 'M':
+            self.cur = gallop(self.op, docID, self.cur)
+            return self.op[self.cur] if self.cur < len(self.op) else float("inf")
 
         elif self.op_type == 'B':
-            res1 = self.nodes[0].run(docID)
-            res2 = self.nodes[1].run(docID)
             if self.op == '&':
-                return max(res1, res2)
+                return self.leapfrog(docID)
             elif self.op == '|':
-                return min(res1, res2)
+                return min(node.next_geq(docID) for node in self.nodes)
+            elif self.op == '-':
+                candidate = self.nodes[0].next_geq(docID)
+                while candidate != float("inf") and self.nodes[1].next_geq(candidate) == candidate:
+                    candidate = self.nodes[0].next_geq(candidate + 1)
+                return candidate
             else:
-                raise "Unknown binary operand"
+                raise RuntimeError(f"Unknown binary operand: {self.op}")
 
         elif self.op_type == 'U':
-            res = self.nodes[0].run(docID)
-            if res == docID:
-                return res + 1
-            else:
-                return docID
+            while docID != float("inf") and self.nodes[0].next_geq(docID) == docID:
+                docID += 1
+            return docID
+
+        elif self.op_type == 'P':
+            candidate = self.leapfrog(docID)
+            while candidate != float("inf") and not self.match_positions():
+                candidate = self.leapfrog(candidate + 1)
+            return candidate
         
         else:
             raise RuntimeError(f"Unknown operand: {self.op}, {self.op_type}")
 
+    def leapfrog(self, docID):
+        """Intersection: the first (the rarest) operand proposes candidate, others jump to it"""
+        candidate = self.nodes[0].next_geq(docID)
+        i = 1
+        while i < len(self.nodes) and candidate != float("inf"):
+            found = self.nodes[i].next_geq(candidate)
+            if found == candidate:
+                i += 1
+            else:
+                candidate = self.nodes[0].next_geq(found)
+                i = 1
+        return candidate
+
+    def match_positions(self):
+        """Check positions of words in the document where all operands stand now"""
+        positions = [node.cursor.get_positions() for node in self.nodes]
+        if self.op is None:
+            # phrase: word i stands at start + i
+            starts = positions[0]
+            for i, word_positions in enumerate(positions[1:], 1):
+                starts = np.intersect1d(starts, word_positions - i, assume_unique=True)
+            return len(starts) > 0
+        first, second = positions
+        nearest = np.minimum(np.searchsorted(second, first), len(second) - 1)
+        distance = np.abs(second[nearest] - first)
+        distance = np.minimum(distance, np.abs(second[np.maximum(nearest - 1, 0)] - first))
+        return distance.min() <= self.op
+
+    def get_touched(self):
+        """Number of postings which were decoded (or enumerated for 'A', words of bitmaps for 'M') by the node"""
+        if self.op_type == 'O':
+            return self.cursor.touched
+        if self.op_type in ('A', 'M'):
+            return self.touched
+        return sum(node.get_touched() for node in self.nodes)
+
+    def explain(self, depth=0):
+        name = {'A': 'ALL', 'M': 'BITMAP'}.get(self.op_type, self.op)
+        if self.op_type == 'P':
+            name = 'PHRASE' if self.op is None else f"/{self.op}"
+        lines = [f"{'    ' * depth}{name}  estimated={self.estimate} touched={self.get_touched()}"]
+        if self.op_type in ('B', 'U', 'P'):
+            for node in self.nodes:
+                lines.extend(node.explain(depth + 1))
+        return lines
+
 
 class QueryTree:
 
     OP = {'&', '|', '!'}
+    MAX_EXPANSIONS = 10000
 
     def __init__(self, query):
-        self.max_docID = max(url_to_docID.values())
+        self.max_docID = reversed_index.max_docID
         self.query = self.get_pref_not(self, query)
-        self.head = self.make_tree(self, self.query)
+        self.plan = self.make_plan(self.get_expression(self, self.query))
+        if self.plan[0] == '!':
+            self.plan = ('-', ('A',), self.plan[1])
+        # the same plan is executed in every segment, ranges of docIDs of segments go in order
+        self.heads = [(first, last, self.make_tree(self.plan, segment, first, last)) for segment, first, last in reversed_index]
 
     @staticmethod
     def get_tokens(cls, query):
+        """
+        Words (with '*' after the first letter - pattern of words), operators, '/k' (words at distance <= k)
+        and ('"', words) for phrase in quotes. Words are split and normalized by tokenizer of index
+        """
         tokens = []
-        buffer = ""
-        for ch in query.lower():
-            if ch.isalpha():
-                buffer += ch
-                continue
-            if buffer:
-                tokens.append(buffer)
-            buffer = ''
-            if not ch.isspace():
-                tokens.append(ch)
-        if buffer:
-            tokens.append(buffer)
+        phrase = None
+        for kind, token in tokenizer.query_tokens(query, word_to_ID):
+            if kind == 'word':
+                (tokens if phrase is None else phrase).append(token)
+            elif token == '"':
+                if phrase is None:
+                    phrase = []
+                else:
+                    tokens.append(('"', tuple(phrase)))
+                    phrase = None
+            elif phrase is None:
+                tokens.append(token)
+        if phrase is not None:
+            tokens.append(('"', tuple(phrase)))
         return tokens
     
     @staticmethod
@@ -84,7 +236,7 @@ class QueryTree:
         tokens = cls.get_tokens(cls, query)
         notation = []
         stack = []
-        priority = {'!' : 4, '&' : 3, '|' : 2, '(' : 1}
+        priority = {'/' : 5, '!' : 4, '&' : 3, '|' : 2, '(' : 1}
 
         for token in tokens:
             if token == '(':
@@ -93,8 +245,8 @@ class QueryTree:
                 while stack[-1] != '(':
                     notation.append(stack.pop())
                 stack.pop()
-            elif token in cls.OP:
-                while len(stack) > 0 and priority[stack[-1]] >= priority[token]:
+            elif token in cls.OP or token[0] == '/':
+                while len(stack) > 0 and priority[stack[-1][0]] >= priority[token[0]]:
                     notation.append(stack.pop()) 
                 stack.append(token)
             else:
@@ -103,48 +255,377 @@ class QueryTree:
         notation.extend(stack[::-1])
 
         return notation
-    
+
     @staticmethod
-    def make_tree(cls, query):
+    def get_expression(cls, query):
+        """
+        Expression from notation: ('O', word), ('!', node), ('&', [nodes]), ('|', [nodes]),
+        positional ('"', [words]) and ('/k', [word, word]) where words are ('O', word),
+        pattern of words becomes ('|', [words]) of its matches
+        """
         stack = []
         for token in query:
             if token == '!':
-                node = NodeTree('U', '!', stack.pop())
+                stack.append(('!', stack.pop()))
             elif token in cls.OP:
-                node = NodeTree('B', token, stack.pop(), stack.pop())
+                right, left = stack.pop(), stack.pop()
+                stack.append((token, [left, right]))
+            elif token[0] == '/':
+                right, left = stack.pop(), stack.pop()
+                if left[0] != 'O' or right[0] != 'O':
+                    raise RuntimeError(f"Operands of {token} must be words")
+                stack.append((token, [left, right]))
+            elif token[0] == '"':
+                if not token[1]:
+                    raise RuntimeError("Empty phrase")
+                if any('*' in word for word in token[1]):
+                    raise RuntimeError("Patterns of words are not supported in phrases")
+                words = [('O', word) for word in token[1]]
+                stack.append(words[0] if len(words) == 1 else ('"', words))
+            elif '*' in token:
+                stack.append(cls.expand(token))
             else:
-                node = NodeTree('O', word_to_ID[token])
-            stack.append(node)
+                stack.append(('O', token))
         return stack[0]
+
+    @staticmethod
+    def expand(pattern):
+        """Pattern of words is '|' of all matching words of lexicon, word of pattern itself if nothing matches"""
+        words = word_to_ID.match(pattern)
+        if len(words) > QueryTree.MAX_EXPANSIONS:
+            raise RuntimeError(f"Too many words for {pattern}: {len(words)}")
+        if len(words) < 2:
+            return ('O', words[0] if words else pattern)
+        return ('|', [('O', word) for word in words])
+
+    @staticmethod
+    def is_positional(plan):
+        return plan[0][0] in ('"', '/')
+
+    def cost(self, plan):
+        """Estimated number of documents in the result of plan by document frequency"""
+        if plan[0] == 'O':
+            return reversed_index.df(word_to_ID.get(plan[1], -1))
+        if plan[0] == 'A':
+            return self.max_docID + 1
+        if plan[0] == '&' or self.is_positional(plan):
+            return min(self.cost(node) for node in plan[1])
+        if plan[0] == '|':
+            return min(self.max_docID + 1, sum(self.cost(node) for node in plan[1]))
+        if plan[0] == '-':
+            return self.cost(plan[1])
+        return self.max_docID + 1 - self.cost(plan[1])
+
+    def estimate(self, plan):
+        """Estimated number of postings touched by plan: sum of document frequencies of its words"""
+        if plan[0] in ('O', 'A'):
+            return self.cost(plan)
+        if plan[0] == '-':
+            return self.estimate(plan[1]) + self.estimate(plan[2])
+        return sum(self.estimate(node) for node in plan[1])
+
+    @staticmethod
+    def flatten(op, nodes):
+        result = []
+        for node in nodes:
+            if node[0] == op:
+                result.extend(node[1])
+            else:
+                result.append(node)
+        return result
+
+    def join(self, op, nodes):
+        nodes = self.flatten(op, nodes)
+        return nodes[0] if len(nodes) == 1 else (op, nodes)
+
+    def make_plan(self, expression, negated=False):
+        """
+        Plan of evaluation: chains of '&' and '|' are flattened and sorted by cost,
+        negations are pushed down by De Morgan and '&' with negations becomes '-' (and not),
+        so negation never drives the iteration. Plan is ('!', node) only when all of it is negative
+        """
+        if expression[0] == 'O' or self.is_positional(expression):
+            return ('!', expression) if negated else expression
+        if expression[0] == '!':
+            return self.make_plan(expression[1], not negated)
+
+        op = expression[0]
+        if negated:
+            op = '&' if op == '|' else '|'
+        nodes = self.flatten(op, [self.make_plan(node, negated) for node in expression[1]])
+
+        positive = sorted((node for node in nodes if node[0] != '!'), key=self.cost)
+        negative = sorted((node[1] for node in nodes if node[0] == '!'), key=self.cost)
+
+        if op == '&':
+            if not positive:
+                # !a & !b = !(a | b)
+                return ('!', self.join('|', negative))
+            plan = self.join('&', positive)
+            if negative:
+                plan = ('-', plan, self.join('|', negative))
+            return plan
+
+        if not negative:
+            return self.join('|', positive)
+        # a | !b = !(b & !a)
+        plan = self.join('&', negative)
+        if positive:
+            plan = ('-', plan, self.join('|', positive))
+        return ('!', plan)
+
+    def is_dense(self, plan, segment):
+        """Plan is driven by dense (bitmap) posting lists, so it is faster to evaluate it word by word on bitmaps"""
+        if plan[0] == 'A':
+            return True
+        if plan[0] == 'O':
+            return get_postings(segment, word_to_ID.get(plan[1], -1)).is_bitmap
+        if plan[0] == '&':
+            return all(self.is_dense(node, segment) for node in plan[1])
+        if plan[0] == '|':
+            return any(self.is_dense(node, segment) for node in plan[1])
+        if plan[0] == '-':
+            return self.is_dense(plan[1], segment)
+        return False
+
+    def bitmap(self, plan, segment, first, last, start, n_words):
+        """
+        Result of plan in segment as uint64 words of bitmap from start, returns (words, touched):
+        lists are converted to bitmaps, subtrees which are not dense are iterated
+        """
+        if plan[0] == 'A':
+            words = np.full(n_words, np.uint64(2 ** 64 - 1))
+            words[0] &= np.uint64((2 ** 64 - 1) ^ ((1 << (first - start)) - 1))
+            words[-1] &= np.uint64((1 << ((last - start) % 64 + 1)) - 1)
+            return words, n_words
+        if plan[0] == 'O':
+            return get_postings(segment, word_to_ID.get(plan[1], -1)).to_bitmap(start, n_words), n_words
+        if plan[0] in ('&', '|', '-') and self.is_dense(plan, segment):
+            nodes = [plan[1], plan[2]] if plan[0] == '-' else plan[1]
+            results = [self.bitmap(node, segment, first, last, start, n_words) for node in nodes]
+            words = results[0][0]
+            for other, _ in results[1:]:
+                if plan[0] == '&':
+                    words = words & other
+                elif plan[0] == '|':
+                    words = words | other
+                else:
+                    words = words & ~other
+            return words, sum(touched for _, touched in results)
+
+        tree = self.make_tree(plan, segment, first, last)
+        docs = []
+        docID = tree.next_geq(first)
+        while docID <= last:
+            docs.append(docID)
+            docID = tree.next_geq(docID + 1)
+        return docs_to_bitmap(docs, start, n_words), tree.get_touched()
+
+    def make_tree(self, plan, segment, first, last):
+        if plan[0] == 'O':
+            node = NodeTree('O', plan[1], segment)
+        elif plan[0] == 'A':
+            node = NodeTree('A', last)
+        elif plan[0] in ('&', '|', '-') and self.is_dense(plan, segment):
+            start = first // 64 * 64
+            words, touched = self.bitmap(plan, segment, first, last, start, (last - start) // 64 + 1)
+            node = NodeTree('M', bitmap_to_docs(words, start).tolist(), touched)
+        elif plan[0] == '-':
+            node = NodeTree('B', '-', self.make_tree(plan[1], segment, first, last),
+                            self.make_tree(plan[2], segment, first, last))
+        elif self.is_positional(plan):
+            distance = None if plan[0] == '"' else int(plan[0][1:])
+            node = NodeTree('P', distance, *[self.make_tree(elem, segment, first, last) for elem in plan[1]])
+        else:
+            node = NodeTree('B', plan[0], *[self.make_tree(elem, segment, first, last) for elem in plan[1]])
+        node.estimate = self.estimate(plan)
+        return node
         
     def search(self):
-        docID = -1
+        """Results of all segments one after another, deleted documents are skipped"""
         documents = []
-        while docID <= self.max_docID:
-            foundID = self.head.run(docID)
-            if foundID == docID:
-                if docID != -1:
+        for first, last, head in self.heads:
+            docID = head.next_geq(first)
+            while docID <= last:
+                if not reversed_index.deleted[docID]:
                     documents.append(docID_to_url[docID])
-                docID += 1
-            else:
-                docID = foundID
+                docID = head.next_geq(docID + 1)
         return documents
 
+    def explain(self):
+        if len(self.heads) == 1:
+            return '\n'.join(self.heads[0][2].explain())
+        lines = []
+        for first, last, head in self.heads:
+            lines.append(f"segment [{first}, {last}]:")
+            lines.extend(head.explain(1))
+        return '\n'.join(lines)
+
+
+class TermScorer:
+    """
+    Cursor of query word in segment with BM25 weight of word and upper bound of its score in segment.
+    idf counts only not deleted documents, as docs_count does
+    """
+
+    MIN_IDF = 1e-6
+
+    def __init__(self, index, word, segment, first):
+        key = word_to_ID.get(word, -1)
+        df = reversed_index.live_df(key)
+        self.index = index
+        self.word = word
+        self.idf = max(log(1 + (reversed_index.docs_count - df + 0.5) / (df + 0.5)), self.MIN_IDF)
+        # bm25_tf grows with avgdl not faster than avgdl, so bound of segment is scaled if avgdl became bigger
+        scale = max(1, reversed_index.avgdl / segment.avgdl) if segment.avgdl else 0
+        self.upper_bound = self.idf * segment.max_score(key) * scale
+        self.cursor = PostingCursor(get_postings(segment, key))
+        self.doc = self.cursor.next_geq(first)
+
+    def next_geq(self, docID):
+        self.doc = self.cursor.next_geq(docID)
+
+    def score(self):
+        length = reversed_index.doc_lengths[self.doc]
+        return self.idf * bm25_tf(self.cursor.get_tf(), length, reversed_index.avgdl)
+
+
+class RankedQuery:
+    """
+    Top-k documents by BM25 for words of query (operators are ignored, any word is enough)
+
+    WAND: words are sorted by current docID, pivot is the first docID where sum of upper bounds
+    of words standing at or before it can beat the k-th best score, documents before pivot are skipped
+    """
+
+    def __init__(self, query, k=10):
+        self.query = query
+        self.k = k
+        self.words = list(dict.fromkeys(self.get_words(query)))
+        self.scored = 0
+        self.skipped = 0
+
+    @staticmethod
+    def get_words(query):
+        for token in QueryTree.get_tokens(QueryTree, query):
+            if token[0] == '"':
+                yield from token[1]
+            elif '*' in token:
+                yield from word_to_ID.match(token)
+            elif token[0].isalnum():
+                yield token
+
+    def search(self, prune=True):
+        """Pairs (url, score) by decreasing score, without prune all documents with query words are scored"""
+        self.heap = []  # k best pairs (score, -docID)
+        for segment, first, last in reversed_index:
+            scorers = [TermScorer(i, word, segment, first) for i, word in enumerate(self.words)]
+            self.search_segment(scorers, last, prune)
+        return [(docID_to_url[-docID], score) for score, docID in sorted(self.heap, reverse=True)]
+
+    def search_segment(self, scorers, last, prune):
+        scorers = [scorer for scorer in scorers if scorer.doc <= last]
+        while scorers:
+            scorers.sort(key=lambda scorer: scorer.doc)
+            threshold = self.heap[0][0] if prune and len(self.heap) == self.k else -1
+
+            pivot = None
+            bound = 0
+            for scorer in scorers:
+                bound += scorer.upper_bound
+                if bound > threshold:
+                    pivot = scorer.doc
+                    break
+            if pivot is None:
+                break
+
+            if scorers[0].doc == pivot:
+                matched = sorted((scorer for scorer in scorers if scorer.doc == pivot), key=lambda scorer: scorer.index)
+                if not reversed_index.deleted[pivot]:
+                    self.scored += 1
+                    score = sum(scorer.score() for scorer in matched)
+                    if len(self.heap) < self.k:
+                        heapq.heappush(self.heap, (score, -pivot))
+                    elif score > self.heap[0][0]:
+                        heapq.heapreplace(self.heap, (score, -pivot))
+                for scorer in matched:
+                    scorer.next_geq(pivot + 1)
+            else:
+                # words before pivot can not give enough score until pivot
+                self.skipped += 1
+                scorers[0].next_geq(pivot)
+            scorers = [scorer for scorer in scorers if scorer.doc <= last]
+
+    def explain(self):
+        return f"words={self.words} scored={self.scored} skips={self.skipped}"
+
+
+def rank_sh(query, k=10, explain=False):
+    ranked = RankedQuery(query, k)
+    documents = ranked.search()
+    if explain:
+        print(query, ranked.explain(), sep='\n', file=stderr)
+
+    return documents
+
 
-def search_sh(query):
+def search_sh(query, explain=False):
     tree = QueryTree(query)
     documents = tree.search()
+    if explain:
+        print(query, tree.explain(), sep='\n', file=stderr)
     
     return documents
 
 
+def init_search(dirname='load_data', postings_cache_mb=64, results_cache_size=1024):
+    """Load index into globals of module: index files are memory-mapped, so processes share their pages"""
+    global reversed_index, docID_to_url, url_to_docID, word_to_ID, index_dirname, postings_cache, results_cache, tokenizer
+    index_dirname = dirname
+    reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=dirname)
+    tokenizer = Tokenizer.load(dirname)
+    postings_cache = LRUCache(postings_cache_mb * 2**20, sizeof=lambda postings: postings.nbytes)
+    results_cache = LRUCache(results_cache_size)
+
+
+def check_index():
+    """Reload index and clear caches (counters are kept) if index was rebuilt or changed since loading"""
+    global reversed_index, docID_to_url, url_to_docID, word_to_ID, tokenizer
+    if MultiSegment.get_version(index_dirname) != reversed_index.version:
+        # old segments are not closed: cached posting lists may still point into their mmap
+        postings_cache.clear()
+        results_cache.clear()
+        reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data(dirname=index_dirname)
+        tokenizer = Tokenizer.load(index_dirname)
+
+
+def cache_stats():
+    return {'postings': postings_cache.stats(), 'results': results_cache.stats()}
+
+
+def answer(query, top=None, explain=False):
+    """Lines of documents for query: URLs of boolean search or URLs with scores for top-k"""
+    check_index()
+    key = (repr(QueryTree.get_tokens(QueryTree, query)), top)
+    documents = None if explain else results_cache.get(key)
+    if documents is None:
+        if top:
+            documents = [f"{url} {score:.4f}" for url, score in rank_sh(query, top, explain)]
+        else:
+            documents = search_sh(query, explain)
+        results_cache.put(key, documents)
+    return documents
+
+
+def format_answer(query, documents):
+    lines = [query, str(len(documents))] + documents
+    return '\n'.join(lines) + '\n'
+
+
 if __name__ == '__main__':
-    reversed_index, docID_to_url, url_to_docID, word_to_ID = load_data()
+    explain = '--explain' in argv
+    top = int(argv[argv.index('--top') + 1]) if '--top' in argv else None
+    init_search()
     for query in stdin:
         query = query.strip()
-        documents = search_sh(query)
-        print(query)
-        print(len(documents))
-        if len(documents):
-            print(*documents, sep='\n')
-        print()
+        print(format_answer(query, answer(query, top, explain)))
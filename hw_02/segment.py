@@ -0,0 +1,264 @@
+import os
+import json
+import mmap
+import struct
+from itertools import islice
+import numpy as np
+
+
+BM25_K1 = 2
+BM25_B = 0.75
+
+
+def bm25_tf(tfs, lengths, avgdl, k1=BM25_K1, b=BM25_B):
+    """BM25 score of word in document without idf, works for numbers and numpy arrays"""
+    return tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths / avgdl))
+
+
+def encode_postings(args):
+    """
+    Encode batch of triples (wordID, docID of every occurrence, positions of occurrences or None),
+    returns (wordID, data, positions data, df, upper bound of bm25_tf over documents of word)
+    """
+    IntCoder, batch, doc_lengths, avgdl = args
+    int_coder = IntCoder()
+    result = []
+    for key, occurrences, positions in batch:
+        if len(occurrences):
+            docs, tfs = np.unique(occurrences, return_counts=True)
+            max_score = bm25_tf(tfs, doc_lengths[docs], avgdl).max() if avgdl else 0
+            # float32 is rounded up, so it is still upper bound
+            max_score = np.nextafter(np.float32(max_score), np.float32(np.inf))
+            result.append((key, *int_coder.encode(docs, tfs, positions), len(docs), max_score))
+    return result
+
+
+class Segment:
+    """
+    Read-only on-disk segment of the reversed index
+
+    Segment consists of three files:
+    - {name}.dict - header (with average document length which was used for upper bounds) and fixed size
+      records (offset, length, df, positions offset, positions length, upper bound of bm25_tf),
+      record i describes wordID i
+    - {name}.postings - raw packed uint32 words of all posting lists (docIDs and term frequencies)
+    - {name}.positions - packed positions of all posting lists, empty if index is built without positions
+
+    All files are opened with mmap, posting list is decoded only when it is requested
+    """
+
+    MAGIC = b'IRS3'
+    HEADER = struct.Struct('<4sId')
+    RECORD = struct.Struct('<QIIQIf')
+
+    def __init__(self, IntCoder, dirname='load_data', name='reversed_index'):
+        self.int_coder = IntCoder()
+        self.name = name
+        self._dict_file = open(f"{dirname}/{name}.dict", 'rb')
+        self._postings_file = open(f"{dirname}/{name}.postings", 'rb')
+        self._positions_file = open(f"{dirname}/{name}.positions", 'rb')
+        self._dict = self._mmap(self._dict_file)
+        self._postings = self._mmap(self._postings_file)
+        self._positions = self._mmap(self._positions_file)
+        self.has_positions = len(self._positions) > 0
+
+        magic, self.size, self.avgdl = self.HEADER.unpack_from(self._dict, 0)
+        if magic != self.MAGIC:
+            raise RuntimeError(f"Wrong segment format: {dirname}/{name}.dict")
+
+    @staticmethod
+    def _mmap(f):
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def write(cls, items, IntCoder, dirname='load_data', name='reversed_index', pool=None, batch_size=1024, window=16,
+              doc_lengths=None, avgdl=0):
+        """
+        items - triples (wordID, docID of every occurrence, positions of occurrences or None) sorted by wordID,
+        all files are written as a stream
+
+        With pool posting lists are encoded by worker processes: window batches at a time,
+        so memory does not depend on the size of index
+
+        doc_lengths (by docID) and avgdl are used for upper bounds of scores, without them bounds are 0
+        """
+        size = 0
+        offset = 0
+        pos_offset = 0
+        items = iter(items)
+
+        with open(f"{dirname}/{name}.dict", 'wb') as dict_file, open(f"{dirname}/{name}.postings", 'wb') as postings_file, \
+                open(f"{dirname}/{name}.positions", 'wb') as positions_file:
+            dict_file.write(cls.HEADER.pack(cls.MAGIC, size, avgdl))
+            while True:
+                batches = [
+                    (IntCoder, list(islice(items, batch_size)), doc_lengths, avgdl) for _ in range(window if pool else 1)
+                ]
+                batches = [batch for batch in batches if batch[1]]
+                if not batches:
+                    break
+                for batch in (pool.map(encode_postings, batches) if pool else map(encode_postings, batches)):
+                    for key, data, positions, df, max_score in batch:
+                        postings_file.write(data)
+                        positions_file.write(positions)
+                        dict_file.write(cls.RECORD.pack(0, 0, 0, 0, 0, 0) * (key - size))
+                        dict_file.write(cls.RECORD.pack(offset, len(data), df, pos_offset, len(positions), max_score))
+                        offset += len(data)
+                        pos_offset += len(positions)
+                        size = key + 1
+
+            dict_file.seek(0)
+            dict_file.write(cls.HEADER.pack(cls.MAGIC, size, avgdl))
+
+    def _record(self, key):
+        if not 0 <= key < self.size:
+            return 0, 0, 0, 0, 0, 0
+        return self.RECORD.unpack_from(self._dict, self.HEADER.size + key * self.RECORD.size)
+
+    def _data(self, key):
+        offset, length, df, pos_offset, pos_length, _ = self._record(key)
+        if length == 0:
+            return self.int_coder.encode([])
+        data = np.frombuffer(self._postings, dtype=np.uint8, count=length, offset=offset)
+        positions = np.frombuffer(self._positions, dtype=np.uint8, count=pos_length, offset=pos_offset)
+        return data, positions
+
+    def __contains__(self, key):
+        return self._record(key)[1] > 0
+
+    def postings(self, key):
+        """Posting list of wordID without decoding, blocks are read straight from mmap"""
+        return self.int_coder.postings(*self._data(key))
+
+    def docs(self, key):
+        """All docIDs of wordID as numpy array"""
+        if key not in self:
+            return np.zeros(0, dtype=np.int64)
+        return self.int_coder.decode(self._data(key)[0])
+
+    def occurrences(self, key):
+        """docID of every occurrence and positions of occurrences (None without positions), as for write"""
+        docs, tfs, positions = self.int_coder.decode_all(*self._data(key))
+        return np.repeat(docs, tfs), positions
+
+    def __getitem__(self, key):
+        return self.docs(key).tolist()
+
+    def df(self, key):
+        return self._record(key)[2]
+
+    def max_score(self, key):
+        """Upper bound of bm25_tf of wordID over documents of segment, computed with self.avgdl"""
+        return self._record(key)[5]
+
+    def keys(self):
+        return [key for key in range(self.size) if key in self]
+
+    def items(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def close(self):
+        for data in (self._dict, self._postings, self._positions):
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._dict_file.close()
+        self._postings_file.close()
+        self._positions_file.close()
+
+
+class MultiSegment:
+    """
+    Reversed index of several immutable segments with stable global IDs
+
+    Manifest {dirname}/segments.json lists segments (name, first docID, last docID) in order of docIDs,
+    ranges of segments do not intersect. Deleted docIDs are marked in tombstone bitmap {dirname}/tombstones
+    and are skipped by docs() and by search, df counts them until segments are compacted, live_df doesn't.
+    Lengths of all documents (in words) are stored in {dirname}/doc_lengths as uint32
+    """
+
+    MANIFEST = 'segments.json'
+    TOMBSTONES = 'tombstones'
+    DOC_LENGTHS = 'doc_lengths'
+
+    def __init__(self, IntCoder, dirname='load_data'):
+        self.version = self.get_version(dirname)
+        manifest = self.read_manifest(dirname)
+        self.generation = manifest['generation']
+        self.names = [name for name, _, _ in manifest['segments']]
+        self.ranges = [(first, last) for _, first, last in manifest['segments']]
+        self.segments = [Segment(IntCoder, dirname, name) for name in self.names]
+        self.max_docID = self.ranges[-1][1] if self.ranges else -1
+        self.has_positions = all(segment.has_positions for segment in self.segments)
+
+        deleted = np.fromfile(f"{dirname}/{self.TOMBSTONES}", dtype=np.uint8)
+        self.deleted = np.unpackbits(deleted, count=self.max_docID + 1).astype(bool)
+        self.doc_lengths = np.fromfile(f"{dirname}/{self.DOC_LENGTHS}", dtype='<u4').astype(np.int64)
+        self.docs_count, self.avgdl = self.live_stats(self.doc_lengths, self.deleted)
+        self._has_deleted = bool(self.deleted.any())
+        self._live_df = {}
+
+    @staticmethod
+    def live_stats(doc_lengths, deleted):
+        """Number of not deleted documents and their average length"""
+        live = doc_lengths[:len(deleted)][~deleted]
+        return len(live), live.mean() if len(live) else 0
+
+    @classmethod
+    def get_version(cls, dirname):
+        """Manifest is replaced by every change of index (build, add, delete, compact), so its mtime is version"""
+        return os.stat(f"{dirname}/{cls.MANIFEST}").st_mtime_ns
+
+    @classmethod
+    def read_manifest(cls, dirname):
+        with open(f"{dirname}/{cls.MANIFEST}") as f:
+            return json.load(f)
+
+    @classmethod
+    def write(cls, dirname, segments, deleted, generation):
+        """segments - triples (name, first docID, last docID), deleted - bool array, manifest is written last"""
+        np.packbits(deleted).tofile(f"{dirname}/{cls.TOMBSTONES}")
+        with open(f"{dirname}/{cls.MANIFEST}.tmp", 'w') as f:
+            json.dump({'generation': generation, 'segments': [list(segment) for segment in segments]}, f)
+        os.replace(f"{dirname}/{cls.MANIFEST}.tmp", f"{dirname}/{cls.MANIFEST}")
+
+    def __iter__(self):
+        """Triples (segment, first docID, last docID)"""
+        for segment, (first, last) in zip(self.segments, self.ranges):
+            yield segment, first, last
+
+    def __contains__(self, key):
+        return any(key in segment for segment in self.segments)
+
+    def docs(self, key):
+        docs = np.concatenate([np.zeros(0, dtype=np.int64)] + [segment.docs(key) for segment in self.segments])
+        return docs[~self.deleted[docs]]
+
+    def __getitem__(self, key):
+        return self.docs(key).tolist()
+
+    def df(self, key):
+        return sum(segment.df(key) for segment in self.segments)
+
+    def live_df(self, key):
+        """Number of not deleted documents with wordID, the same set of documents as docs_count counts"""
+        if not self._has_deleted:
+            return self.df(key)
+        if key not in self._live_df:
+            self._live_df[key] = len(self.docs(key))
+        return self._live_df[key]
+
+    def keys(self):
+        return sorted(set().union(*[segment.keys() for segment in self.segments]))
+
+    def items(self):
+        for key in self.keys():
+            docs = self[key]
+            if docs:
+                yield key, docs
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
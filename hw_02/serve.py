@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from sys import stdout, stderr
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Pool, Semaphore
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+import search
+
+
+def init_worker(dirname, postings_cache_mb=64, results_cache_size=1024, ready=None):
+    """Loads index in worker process, then releases semaphore ready (if given)"""
+    search.init_search(dirname, postings_cache_mb, results_cache_size)
+    if ready is not None:
+        ready.release()
+
+
+def run_query(args):
+    """Answer for one query in worker process, returns (query, documents, seconds, (pid, cache stats of worker))"""
+    query, top = args
+    start = time.perf_counter()
+    documents = search.answer(query, top)
+    return query, documents, time.perf_counter() - start, (os.getpid(), search.cache_stats())
+
+
+def report(latencies, seconds, worker_stats):
+    """
+    Throughput and latency percentiles, latency is time of query in worker,
+    hits and misses of caches are summed over workers (worker_stats - pid: last cache stats)
+    """
+    latencies = np.array(latencies) * 1000
+    qps = len(latencies) / seconds if seconds else 0
+    p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0, 0)
+    result = {'queries': len(latencies), 'qps': round(qps, 1), 'p50_ms': round(p50, 3), 'p99_ms': round(p99, 3)}
+    for name in ('postings', 'results'):
+        hits = sum(stats[name]['hits'] for stats in worker_stats.values())
+        misses = sum(stats[name]['misses'] for stats in worker_stats.values())
+        result[f"{name}_cache"] = {'hits': hits, 'misses': misses}
+    return result
+
+
+def batch_sh(filename, workers=1, top=None, dirname='load_data', chunksize=8, postings_cache_mb=64, results_cache_size=1024):
+    """
+    Queries of file are answered by pool of processes, every process loads index once,
+    answers are written in order of queries in the same format as search.py
+    """
+    with open(filename, encoding='utf-8') as f:
+        queries = [line.strip() for line in f]
+
+    latencies = []
+    worker_stats = {}
+    ready = Semaphore(0)
+    with Pool(workers, initializer=init_worker, initargs=(dirname, postings_cache_mb, results_cache_size, ready)) as pool:
+        # wait until every process has loaded index, so loading is not counted in throughput
+        for _ in range(workers):
+            ready.acquire()
+        start = time.perf_counter()
+        for query, documents, seconds, (pid, stats) in pool.imap(run_query, [(query, top) for query in queries], chunksize):
+            stdout.write(search.format_answer(query, documents) + '\n')
+            latencies.append(seconds)
+            worker_stats[pid] = stats
+        total = time.perf_counter() - start
+
+    print(json.dumps(report(latencies, total, worker_stats)), file=stderr)
+
+
+class SearchServer:
+    """
+    HTTP server on asyncio: GET /search?q=query[&top=k] returns json with documents,
+    GET /stats - throughput and latency of last queries and caches of workers. Queries are answered by pool of processes
+    """
+
+    def __init__(self, workers=1, dirname='load_data', window=10000, postings_cache_mb=64, results_cache_size=1024):
+        self.executor = ProcessPoolExecutor(
+            workers, initializer=init_worker, initargs=(dirname, postings_cache_mb, results_cache_size)
+        )
+        self.latencies = deque(maxlen=window)
+        self.times = deque(maxlen=window)
+        self.worker_stats = {}
+
+    async def handle(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode('utf-8').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            status, body = await self.route(request[1] if len(request) > 1 else '/')
+        except Exception as error:
+            status, body = '500 Internal Server Error', {'error': str(error)}
+
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('utf-8') + data)
+        await writer.drain()
+        writer.close()
+
+    async def route(self, target):
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if url.path == '/stats':
+            seconds = self.times[-1] - self.times[0] if len(self.times) > 1 else 0
+            return '200 OK', report(list(self.latencies), seconds, self.worker_stats)
+        if url.path != '/search' or 'q' not in params:
+            return '404 Not Found', {'error': "use /search?q=query[&top=k] or /stats"}
+
+        top = int(params['top'][0]) if 'top' in params else None
+        loop = asyncio.get_running_loop()
+        query, documents, seconds, (pid, stats) = await loop.run_in_executor(self.executor, run_query, (params['q'][0], top))
+        self.latencies.append(seconds)
+        self.worker_stats[pid] = stats
+        self.times.append(time.perf_counter())
+        return '200 OK', {'query': query, 'count': len(documents), 'documents': documents, 'ms': seconds * 1000}
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Listening on http://{host}:{port}", file=stderr)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Answer queries by pool of processes")
+    parser.add_argument('mode', choices=['batch', 'server'])
+    parser.add_argument('filename', nargs='?', help="batch: file with queries, one per line")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes")
+    parser.add_argument('--top', type=int, default=None, help="top-k by BM25 instead of boolean search")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cache-mb', type=int, default=64, help="budget of cache of posting lists of every process, MB")
+    parser.add_argument('--results-cache', type=int, default=1024, help="number of answers in cache of every process")
+    args = parser.parse_args()
+
+    if args.mode == 'batch':
+        batch_sh(args.filename, args.workers, args.top, postings_cache_mb=args.cache_mb, results_cache_size=args.results_cache)
+    else:
+        server = SearchServer(args.workers, postings_cache_mb=args.cache_mb, results_cache_size=args.results_cache)
+        asyncio.run(server.serve(args.host, args.port))
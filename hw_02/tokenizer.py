@@ -0,0 +1,102 @@
+import os
+import re
+import json
+from functools import lru_cache
+
+try:
+    from pymorphy2 import MorphAnalyzer
+except ImportError:
+    MorphAnalyzer = None
+
+
+# letters of other cyrillic alphabets and ё are replaced by russian ones (as for queries of hw_04),
+# str.replace for every letter is much faster than str.translate on non-ascii text
+LETTERS = {'ё': 'е', 'і': 'и', 'є': 'е', 'ї': 'й', 'ј': 'й', 'ѓ': 'г', 'ґ': 'г', 'ў': 'у'}
+
+# keys of the same place in english and russian layouts, only letters: punctuation splits words anyway
+EN_LAYOUT = "qwertyuiopasdfghjklzxcvbnm"
+RU_LAYOUT = "йцукенгшщзфывапролдячсмить"
+LAYOUT = str.maketrans(EN_LAYOUT + RU_LAYOUT, RU_LAYOUT + EN_LAYOUT)
+
+# word - letters and digits, hyphen only inside the word
+WORD = re.compile(r"[^\W_]+(?:-[^\W_]+)*")
+# word or pattern of words with '*', '/k', operator, bracket or quote
+QUERY_TOKEN = re.compile(r'(?P<word>[^\W_](?:[^\W_*]|\*|-(?=[^\W_*]))*)|(?P<near>/\d+)|(?P<op>[&|!()"])')
+
+
+class Tokenizer:
+    """
+    Words of text for index and queries: text is lowercased, letters are normalized (ё - е, ...)
+    and words are found by one regex over the whole text, not char by char.
+    Optionally words are lemmatized by pymorphy2, lemmas are memoized in LRU cache of cache_size words
+
+    Settings are saved with index (tokenizer.json), so queries are split the same way as documents
+    """
+
+    FILENAME = 'tokenizer.json'
+
+    def __init__(self, normalize_letters=True, lemmatize=False, cache_size=2**16):
+        self.normalize_letters = normalize_letters
+        self.lemmatize = lemmatize
+        self.cache_size = cache_size
+        if lemmatize:
+            if MorphAnalyzer is None:
+                raise RuntimeError("Lemmatization needs pymorphy2")
+            morph = MorphAnalyzer()
+            self.lemma = lru_cache(cache_size)(lambda word: morph.normal_forms(word)[0])
+
+    def __reduce__(self):
+        # analyzer and cache are not pickled, every process makes its own
+        return Tokenizer, (self.normalize_letters, self.lemmatize, self.cache_size)
+
+    def settings(self):
+        return {'normalize_letters': self.normalize_letters, 'lemmatize': self.lemmatize, 'cache_size': self.cache_size}
+
+    def save(self, dirname):
+        with open(f"{dirname}/{self.FILENAME}", 'w') as f:
+            json.dump(self.settings(), f)
+
+    @classmethod
+    def load(cls, dirname):
+        """Tokenizer of index, default one for index without settings"""
+        if not os.path.exists(f"{dirname}/{cls.FILENAME}"):
+            return cls()
+        with open(f"{dirname}/{cls.FILENAME}") as f:
+            return cls(**json.load(f))
+
+    def normalize(self, text):
+        text = text.lower()
+        if self.normalize_letters:
+            for letter, replacement in LETTERS.items():
+                text = text.replace(letter, replacement)
+        return text
+
+    def normalize_word(self, word):
+        """Word which is already found in normalized text, patterns with '*' are not lemmatized"""
+        if self.lemmatize and '*' not in word:
+            return self.lemma(word)
+        return word
+
+    def words(self, text):
+        words = WORD.findall(self.normalize(text))
+        if self.lemmatize:
+            return list(map(self.lemma, words))
+        return words
+
+    def query_tokens(self, query, vocabulary=None):
+        """
+        Pairs (kind, token) of query: kind is 'word', 'near' or 'op'.
+        With vocabulary word typed in the other keyboard layout is switched, if only the switched one is known
+        """
+        for match in QUERY_TOKEN.finditer(self.normalize(query)):
+            if match.lastgroup == 'word':
+                yield 'word', self.query_word(match.group(), vocabulary)
+            else:
+                yield match.lastgroup, match.group()
+
+    def query_word(self, word, vocabulary=None):
+        normalized = self.normalize_word(word)
+        if vocabulary is None or '*' in word or normalized in vocabulary:
+            return normalized
+        switched = self.normalize_word(word.translate(LAYOUT))
+        return switched if switched in vocabulary else normalized
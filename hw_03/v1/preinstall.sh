@@ -1,2 +1,2 @@
 #!/bin/bash
-pip-3 install python-Levenshtein
+pip-3 install python-Levenshtein numpy
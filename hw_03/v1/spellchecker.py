@@ -1,21 +1,128 @@
+import heapq
+import time
 import Levenshtein
-from sys import stdin
+import numpy as np
+from array import array
+from sys import stdin, stderr, argv
 
 def search_by_func(req, real_words, n=5, dist_func=Levenshtein.ratio, reverse=True):
     req = req.lower()
-    best_dists = []
-    for word in real_words:
-        dist = dist_func(req, word)
-        best_dists.append((dist, word))
-        best_dists.sort(reverse=reverse)
-        if len(best_dists) > n:
-            best_dists.pop()
-    return best_dists
-    
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    return select(n, ((dist_func(req, word), word) for word in real_words))
+
+
+def deletes(word, max_deletes):
+    """All strings which are obtained from word by deleting at most max_deletes letters"""
+    result = {word}
+    level = {word}
+    for _ in range(max_deletes):
+        level = {variant[:i] + variant[i + 1:] for variant in level for i in range(len(variant))}
+        result |= level
+    return result
+
+
+class DeletesIndex:
+    """
+    Candidates for search_by_func with Levenshtein.ratio (symmetric deletes, as in SymSpell):
+    every word of dictionary is stored under hashes of all its deletes (at most max_deletes letters),
+    candidates of request are words which have common delete with request (at most query_deletes letters)
+
+    Levenshtein.ratio is 2 * LCS / (len(req) + len(word)), word which is not candidate has
+    len(req) - LCS > query_deletes or len(word) - LCS > max_deletes, so its ratio is at most bound(len(req)).
+    If the n-th best candidate is better than bound, result is exact. Otherwise other words are scored
+    in order of decreasing upper bound of ratio by count of common letters (LCS can not be longer),
+    until the bound is less than the n-th best ratio
+    """
+
+    def __init__(self, words, max_deletes=2, query_deletes=2):
+        self.max_deletes = max_deletes
+        self.query_deletes = query_deletes
+        self.words = sorted(words, key=lambda word: (len(word), word))
+        self.lengths = np.array([len(word) for word in self.words], dtype=np.int64)
+
+        keys = array('q')
+        ids = array('i')
+        for i, word in enumerate(self.words):
+            variants = deletes(word, max_deletes)
+            keys.extend(map(hash, variants))
+            ids.extend([i] * len(variants))
+        keys = np.frombuffer(keys, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.ids = np.frombuffer(ids, dtype=np.int32)[order]
+
+        # count of every letter in every word
+        codes = np.frombuffer(''.join(self.words).encode('utf-32-le'), dtype=np.uint32)
+        alphabet, letters = np.unique(codes, return_inverse=True)
+        self.alphabet = {chr(code): i for i, code in enumerate(alphabet.tolist())}
+        rows = np.repeat(np.arange(len(self.words)), self.lengths)
+        counts = np.bincount(rows * len(alphabet) + letters, minlength=len(self.words) * len(alphabet))
+        self.counts = np.minimum(counts, 255).astype(np.uint8).reshape(len(self.words), len(alphabet))
+        self.fallbacks = 0
+
+    def candidates(self, req):
+        hashes = np.array([hash(variant) for variant in deletes(req, self.query_deletes)], dtype=np.int64)
+        starts = np.searchsorted(self.keys, hashes, 'left')
+        ends = np.searchsorted(self.keys, hashes, 'right')
+        ids = np.unique(np.concatenate([self.ids[start:end] for start, end in zip(starts, ends)]))
+        return [self.words[i] for i in ids]
+
+    def bound(self, length):
+        """Upper bound of Levenshtein.ratio of request of length and word which is not its candidate"""
+        shorter = length - self.query_deletes - 1
+        bound = 2 * shorter / (length + shorter) if shorter > 0 else 0
+        return max(bound, 2 * length / (2 * length + self.max_deletes + 1)) + 1e-9
+
+    def letters_bounds(self, req, score=0):
+        """
+        Upper bounds of ratio by count of common letters (LCS can not be longer) for words which can have
+        ratio >= score by lengths (2 * min(lengths) / sum(lengths) >= score), returns (start, bounds)
+        """
+        length = len(req)
+        if score > 0:
+            lo, hi = int(score * length / (2 - score)), int(length * (2 - score) / score) + 1
+        else:
+            lo, hi = 0, self.lengths[-1] if len(self.words) else 0
+        start, end = np.searchsorted(self.lengths, [lo, hi + 1])
+        letters = np.zeros(self.counts.shape[1], dtype=np.uint8)
+        for letter in req:
+            if letter in self.alphabet:
+                letters[self.alphabet[letter]] += 1
+        common = np.minimum(self.counts[start:end], letters).sum(axis=1)
+        return start, 2 * common / (length + self.lengths[start:end])
+
+
+def search_by_index(req, index, n=5):
+    """The same result as search_by_func with Levenshtein.ratio, words are scored only for candidates of index"""
+    req = req.lower()
+    best = heapq.nlargest(n, ((Levenshtein.ratio(req, word), word) for word in index.candidates(req)))
+    if len(best) == n and best[-1][0] > index.bound(len(req)):
+        return best
+    index.fallbacks += 1
+    # other words in order of decreasing bound until bound is less than the n-th best ratio
+    heap = []
+    for ratio, word in best:
+        heapq.heappush(heap, (ratio, word))
+    scored = {word for _, word in best}
+    start, bounds = index.letters_bounds(req, heap[0][0] if len(heap) == n else 0)
+    for i in np.argsort(-bounds, kind='stable'):
+        if len(heap) == n and bounds[i] < heap[0][0] - 1e-9:
+            break
+        word = index.words[start + i]
+        if word in scored:
+            continue
+        item = (Levenshtein.ratio(req, word), word)
+        if len(heap) < n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    return sorted(heap, reverse=True)
+
+
 def get_dict():
     words = set()
 
-    with open('queries_all.txt', 'rt') as f:    
+    with open('queries_all.txt', 'rt') as f:
         file = f.read().split('\n')
         for line in file:
             if '\t' in line:
@@ -25,12 +132,39 @@ def get_dict():
     return words
 
 
+def benchmark(real_words, reqs, n=1):
+    """Latency of lookup of every word: brute force against index, answers must be the same"""
+    start = time.perf_counter()
+    index = DeletesIndex(real_words)
+    print(f"index: {len(index.words)} words, {len(index.keys)} deletes, {time.perf_counter() - start:.1f} s", file=stderr)
+
+    answers = {}
+    for name, search in (('brute force', lambda req: search_by_func(req, real_words, n)),
+                         ('index', lambda req: search_by_index(req, index, n))):
+        latencies = []
+        answers[name] = []
+        for req in reqs:
+            start = time.perf_counter()
+            answers[name].append(search(req))
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        print(f"{name:>12}: mean {latencies.mean():8.3f} ms, p50 {np.percentile(latencies, 50):8.3f} ms, "
+              f"p99 {np.percentile(latencies, 99):8.3f} ms", file=stderr)
+    mismatches = sum(a != b for a, b in zip(answers['brute force'], answers['index']))
+    print(f"mismatches: {mismatches}, fallbacks to letters filter: {index.fallbacks} of {len(reqs)}", file=stderr)
+
+
 if __name__ == '__main__':
     real_words = get_dict()
-    for req in stdin:
-        req = req.split()
-        ans = ''
-        for word in req:
-            word = search_by_func(word, real_words, n=1)[0][1]
-            ans += word + ' '
-        print(ans[:-1])
+    if '--benchmark' in argv:
+        n = int(argv[argv.index('--n') + 1]) if '--n' in argv else 1
+        benchmark(real_words, [word for req in stdin for word in req.split()], n)
+    else:
+        index = DeletesIndex(real_words)
+        for req in stdin:
+            req = req.split()
+            ans = ''
+            for word in req:
+                word = search_by_index(word, index, n=1)[0][1]
+                ans += word + ' '
+            print(ans[:-1])
@@ -1,12 +1,9 @@
 from collections import defaultdict
 import json
 import numpy as np
-try:
-    from tqdm import tqdm
-except ImportError:
-    tqdm = lambda x, *args, **kwargs: x
-    
+
 from utils import check_dir_or_create, word_clean, get_clean_words
+from training import make_models
 
 class ErrorModel:
 
@@ -24,61 +21,75 @@ class ErrorModel:
         return bigrams
     
     @staticmethod
-    def _levenshtein_matrix(a, b):
-        n, m = len(a), len(b)
-        need_transpose = False
-        if n > m:
-            a, b = b, a
-            n, m = m, n
-            need_transpose = True
-
-        current = list(range(n + 1))
-        previous = current
-        lv_matrix = np.array([current])
-        for i in range(1, m + 1):
-            prev_previous, previous, current = previous, current, [i] + [0] * n
-            for j in range(1, n + 1):
-                a_ne_b = int(a[j - 1] != b[i - 1])
-                add    = previous[j] + 1
-                delete = current[j - 1] + 1
-                change = previous[j - 1] + a_ne_b
-                
-                # transpose = change
-                # if j > 1 and i > 1 and a[j - 2] == b[i - 1] and a[j - 1] == b[j - 2]:
-                #     transpose = prev_previous[j - 2] + a_ne_b
+    def _levenshtein_matrices(pairs, group_size=256):
+        """
+        Levenshtein matrices of many pairs (a, b) at once, matrix[i][j] is distance between b[:i] and a[:j].
+        Pairs are sorted by lengths and split into groups, sequences of group are padded to the longest ones
+        and cells of one anti-diagonal (i + j = const) of all matrices of group are filled by one numpy operation:
+        they depend only on the previous two anti-diagonals
+        """
+        order = sorted(range(len(pairs)), key=lambda k: (len(pairs[k][0]), len(pairs[k][1])))
+        result = [None] * len(pairs)
+        codes = {}
+        for start in range(0, len(order), group_size):
+            group = order[start:start + group_size]
+            n = max(len(pairs[k][0]) for k in group)
+            m = max(len(pairs[k][1]) for k in group)
+            # padding of a never matches padding of b, cells beyond the lengths of pair are not read anyway
+            a_codes = np.full((len(group), n), -1, dtype=np.int32)
+            b_codes = np.full((len(group), m), -2, dtype=np.int32)
+            for row, k in enumerate(group):
+                a, b = pairs[k]
+                a_codes[row, :len(a)] = [codes.setdefault(elem, len(codes)) for elem in a]
+                b_codes[row, :len(b)] = [codes.setdefault(elem, len(codes)) for elem in b]
 
-                current[j] = min(add, delete, change)#, transpose)
-            lv_matrix = np.vstack((lv_matrix, [current]))
-        return lv_matrix.T if need_transpose else lv_matrix
+            lv_matrices = np.empty((len(group), m + 1, n + 1), dtype=np.int32)
+            lv_matrices[:, :, 0] = np.arange(m + 1)
+            lv_matrices[:, 0, :] = np.arange(n + 1)
+            for d in range(2, n + m + 1):
+                i = np.arange(max(1, d - n), min(m, d - 1) + 1)
+                j = d - i
+                add = lv_matrices[:, i - 1, j] + 1
+                delete = lv_matrices[:, i, j - 1] + 1
+                change = lv_matrices[:, i - 1, j - 1] + (a_codes[:, j - 1] != b_codes[:, i - 1])
+                lv_matrices[:, i, j] = np.minimum(np.minimum(add, delete), change)
+
+            for row, k in enumerate(group):
+                a, b = pairs[k]
+                result[k] = lv_matrices[row, :len(b) + 1, :len(a) + 1].tolist()
+        return result
+
+    @staticmethod
+    def _levenshtein_matrix(a, b):
+        return ErrorModel._levenshtein_matrices([(a, b)])[0]
     
     def _add_stats(self, orig, fix):
         self.stat[orig][fix] += 1
         self._stat_size += 1
 
     def _get_stats(self, orig, fix):
-        if orig in self.stat and fit in self.stat[orig]:
-            return self.stat[orig][fit]
+        if orig in self.stat and fix in self.stat[orig]:
+            return self.stat[orig][fix]
         return 1.0 / self._stat_size
     
     def _fill_stats(self, a, b, lv_matrix):
         i, j = len(a), len(b)
-        cur_distance = lv_matrix[len(b), len(a)]
+        cur_distance = lv_matrix[len(b)][len(a)]
 
         while cur_distance != 0:
-            add = lv_matrix[j - 1, i] if j > 0 else np.inf
-            delete = lv_matrix[j, i - 1] if i > 0 else np.inf
-            change = lv_matrix[j - 1, i - 1] if j > 0 and i > 0 else np.inf
+            add = lv_matrix[j - 1][i] if j > 0 else np.inf
+            delete = lv_matrix[j][i - 1] if i > 0 else np.inf
+            change = lv_matrix[j - 1][i - 1] if j > 0 and i > 0 else np.inf
 
-            operation = np.argmin([change, add, delete]).item()
-
-            if operation == 0:
+            # the first of the least, as argmin of [change, add, delete]
+            if change <= add and change <= delete:
                 i -= 1
                 j -= 1
                 if cur_distance != change:
                     cur_distance = change
                     self._add_stats(a[i], b[j])
                 
-            elif operation == 1:
+            elif add <= delete:
                 j -= 1
                 if cur_distance != add:
                     cur_distance = add
@@ -88,37 +99,54 @@ class ErrorModel:
                 if cur_distance != delete:
                     cur_distance = delete
                     self._add_stats(a[i], b[j - 1][1] + '~')
+
+    def _fill_batch(self, pairs):
+        for (a, b), lv_matrix in zip(pairs, self._levenshtein_matrices(pairs)):
+            self._fill_stats(a, b, lv_matrix)
     
     def normalize_stat(self):
         for orig in self.stat:
             for fix in self.stat[orig]:
                 self.stat[orig][fix] /= self._stat_size
     
-    def make_model(self, filename="queries_all.txt"):
+    def _init_counts(self):
         self.stat = defaultdict(lambda: defaultdict(int))
         self._stat_size = 0
-        with open(filename, 'r') as f:
-            if filename == 'queries_all.txt':
-                tqdm_cur = lambda x: tqdm(x, total=2000000)
-            else:
-                tqdm_cur = tqdm
-            for line in tqdm_cur(f):
-                if '\t' not in line:
-                    continue
-                wrong, right = line.lower().split('\t')
-                wrong = get_clean_words(wrong)
-                right = get_clean_words(right)
-                
-                if len(wrong) != len(right):  # join or split
-                    continue
 
-                for wrong_word, right_word in zip(wrong, right):
-                    wrong_bigrams = self.make_bigrams(wrong_word)
-                    right_bigrams = self.make_bigrams(right_word)
-                    lv_matrix = self._levenshtein_matrix(wrong_bigrams, right_bigrams)
-                    self._fill_stats(wrong_bigrams, right_bigrams, lv_matrix)
+    def _count_lines(self, lines, batch_size=4096):
+        pairs = []
+        for line in lines:
+            if '\t' not in line:
+                continue
+            wrong, right = line.lower().split('\t')
+            wrong = get_clean_words(wrong)
+            right = get_clean_words(right)
+
+            if len(wrong) != len(right):  # join or split
+                continue
+
+            for wrong_word, right_word in zip(wrong, right):
+                if wrong_word != right_word:  # distance is 0, there is no stats
+                    pairs.append((self.make_bigrams(wrong_word), self.make_bigrams(right_word)))
+            if len(pairs) >= batch_size:
+                self._fill_batch(pairs)
+                pairs = []
+        if pairs:
+            self._fill_batch(pairs)
+
+    def _counts(self):
+        return self._stat_size, {orig: dict(fixes) for orig, fixes in self.stat.items()}
+
+    def _merge_counts(self, counts):
+        stat_size, stat = counts
+        self._stat_size += stat_size
+        for orig, fixes in stat.items():
+            orig_stat = self.stat[orig]
+            for fix, count in fixes.items():
+                orig_stat[fix] += count
 
-        self.normalize_stat()
+    def make_model(self, filename="queries_all.txt", workers=1):
+        make_models([self], filename, workers)
     
     def save_model(self, filename='stats.json', directory='prepared_data'):
         check_dir_or_create(directory)
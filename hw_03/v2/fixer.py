@@ -1,24 +1,59 @@
-from itertools import product
+import heapq
+import math
 
 
 class Fixer:
+    """
+    Query is fixed by Viterbi over candidates of its words (k best paths for every candidate):
+    log probability of query is the same as in LanguageModel.query_prob (bigrams and unigram of the last word)
+    plus log probability of errors, error of one edit in SearchTree is 1 / P(orig|fix),
+    so -log(1 + error) is about log P(orig|fix). Time is linear in count of words
+    """
 
-    def __init__(self, language_model, tree):
+    def __init__(self, language_model, tree, n=20, error_weight=1.0):
         self.language_model = language_model
         self.tree = tree
-    
-    def fix(self, query):
+        self.n = n
+        self.error_weight = error_weight
+
+    def fix_variants(self, query, k=5):
+        """At most k pairs (log probability, fixed query), sorted by decreasing log probability"""
         query = query.lower()
         query_variants = []
         for word in query.split():
-            query_variants.append(self.tree.search(word))
-        
-        query_variants = product(*query_variants)
-        result_variants = []
-        for var in query_variants:
-            var = ' '.join(var)
-            prob = self.language_model.query_prob(var)
-            result_variants.append((prob, var))
-        
-        result_variants.sort()
-        return result_variants[0][1]
+            variants = self.tree.search(word, n=self.n, with_errors=True)
+            query_variants.append([(var, -self.error_weight * math.log(1 + error)) for var, error in variants])
+        if not query_variants:
+            return [(0.0, '')]
+
+        # paths[i][j] - k best (log probability, j of the previous word, rank of its path) for variant j of word i
+        paths = [[[(score, None, None)] for _, score in query_variants[0]]]
+        for i in range(1, len(query_variants)):
+            previous = query_variants[i - 1]
+            paths.append([
+                heapq.nlargest(k, (
+                    (path[0] + self.language_model.bigram_log_prob(previous[j][0], var) + score, j, rank)
+                    for j in range(len(previous))
+                    for rank, path in enumerate(paths[i - 1][j])
+                ))
+                for var, score in query_variants[i]
+            ])
+
+        last = query_variants[-1]
+        best = heapq.nlargest(k, (
+            (path[0] + self.language_model.unigram_log_prob(last[j][0]), j, rank)
+            for j in range(len(last))
+            for rank, path in enumerate(paths[-1][j])
+        ))
+
+        result = []
+        for prob, j, rank in best:
+            words = []
+            for i in range(len(query_variants) - 1, -1, -1):
+                words.append(query_variants[i][j][0])
+                _, j, rank = paths[i][j][rank]
+            result.append((prob, ' '.join(reversed(words))))
+        return result
+
+    def fix(self, query):
+        return self.fix_variants(query, k=1)[0][1]
@@ -1,18 +1,24 @@
+import os
+from sys import argv
+
 from error_model import ErrorModel
 from language_model import LanguageModel
 from search_tree import SearchTree
+from training import make_models
 
 if __name__ == '__main__':
+    workers = int(argv[argv.index('--workers') + 1]) if '--workers' in argv else os.cpu_count()
+
     error_model = ErrorModel()
-    error_model.make_model()
+    language_model = LanguageModel()
+    make_models([error_model, language_model], workers=workers)
+
     error_model.save_model()
     print('Error model saved')
-    
-    language_model = LanguageModel()
-    language_model.make_model()
+
     language_model.save_model()
     print('Language model saved')
-    
+
     tree = SearchTree(error_model, language_model.words)
     tree.save_model()
     print('Search Tree saved')
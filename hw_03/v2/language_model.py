@@ -1,91 +1,144 @@
-import json
+import math
+import mmap
+from bisect import bisect_left
+import struct
 from collections import defaultdict
 
-try:
-    from tqdm import tqdm
-except ImportError:
-    tqdm = lambda x, *args, **kwargs: x
-   
+import numpy as np
+
 from utils import check_dir_or_create, word_clean, get_clean_words
+from training import make_models
 
 class LanguageModel:
+    """
+    Unigram and bigram model of words of queries.
+    Words have IDs (indices in sorted order), unigram counts are numpy array by ID, bigrams are CSR matrix:
+    successors of word ID are successors[offsets[ID]:offsets[ID + 1]], sorted by ID,
+    and log_probs are -log P(word_1, word_2) quantized to uint16 (log P = -log_probs / scale).
+
+    File is header, offsets (uint64), unigram counts, successors (uint32), log_probs (uint16) and words,
+    arrays are memory-mapped at load without parsing
+    """
+
+    MAGIC = b'LMC1'
+    HEADER = struct.Struct('<4sIQQQd')
 
     def __init__(self):
-        self._init_by_saved_data()
-
-    def _make_data_to_save(self):
-        data = {
-            'words': list(self.words),
-            'unigram_words_count': self.unigram_words_count,
-            'unigram_model': dict(self.unigram_model),
-            'bigram_words_count': self.bigram_words_count,
-            'bigram_model': dict(self.bigram_model),
-        }
-        return data
-    
-    def _init_by_saved_data(self, data=None):
-        if data is None:
-            self.words = set()
-            self.unigram_words_count = 0
-            self.unigram_model = defaultdict(int)
-            # {'word': P(word)}
-
-            self.bigram_words_count = 0
-            self.bigram_model = defaultdict(lambda: defaultdict(int))
-            # {'word_1': {'word_2': P(word_1|word_2)}}
-            return
-        
-        self.words = set(data['words'])
-        self.unigram_words_count = data['unigram_words_count']
-        self.unigram_model = defaultdict(int, data['unigram_model'])
-        self.bigram_words_count = data['bigram_words_count']
-        self.bigram_model = defaultdict(lambda: defaultdict(int), data['bigram_model'])
-    
+        self._init_counts()
+        self._init_arrays([], np.zeros(0, dtype=np.uint32), np.zeros(1, dtype=np.uint64),
+                          np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16), 1.0)
+
+    def _init_counts(self):
+        self.unigram_words_count = 0
+        self.unigram_counts = defaultdict(int)
+        # {'word': count}
+
+        self.bigram_words_count = 0
+        self.bigram_counts = defaultdict(lambda: defaultdict(int))
+        # {'word_1': {'word_2': count}}
+
+    def _init_arrays(self, words, unigram, offsets, successors, log_probs, scale):
+        self.word_list = words
+        self.words = {word: word_id for word_id, word in enumerate(words)}
+        self.unigram = unigram
+        self.offsets = offsets
+        self.successors = successors
+        self.log_probs = log_probs
+        self.scale = scale
+        # lookups of single elements by memoryview are much faster than by numpy scalars
+        self._offsets = memoryview(offsets)
+        self._successors = memoryview(successors)
+        self._log_probs = memoryview(log_probs)
+
+    def _count_lines(self, lines):
+        for line in lines:
+            if '\t' not in line:
+                continue
+            line = line.split('\t')[1].lower()
+
+            words = get_clean_words(line)
+            len_words = len(words)
+
+            for i, word in enumerate(words):
+                self.unigram_words_count += 1
+                self.unigram_counts[word] += 1
+
+                if i != len_words - 1:
+                    self.bigram_words_count += 1
+                    word_2 = words[i + 1]
+                    self.bigram_counts[word][word_2] += 1
+
+    def _counts(self):
+        return (self.unigram_words_count, dict(self.unigram_counts), self.bigram_words_count,
+                {word: dict(next_words) for word, next_words in self.bigram_counts.items()})
+
+    def _merge_counts(self, counts):
+        unigram_words_count, unigram_counts, bigram_words_count, bigram_counts = counts
+        self.unigram_words_count += unigram_words_count
+        for word, count in unigram_counts.items():
+            self.unigram_counts[word] += count
+        self.bigram_words_count += bigram_words_count
+        for word_1, next_words in bigram_counts.items():
+            word_1_counts = self.bigram_counts[word_1]
+            for word_2, count in next_words.items():
+                word_1_counts[word_2] += count
+
     def normalize_stat(self):
-        for word in self.unigram_model:
-            self.unigram_model[word] /= self.unigram_words_count
-        
-        for word_1 in self.bigram_model:
-            for word_2 in self.bigram_model[word_1]:
-                self.bigram_model[word_1][word_2] /= self.bigram_words_count
-    
-    def make_model(self, filename="queries_all.txt"):
-        self._init_by_saved_data()
-        with open(filename, 'r') as f:
-            if filename == 'queries_all.txt':
-                tqdm_cur = lambda x: tqdm(x, total=2000000)
-            else:
-                tqdm_cur = tqdm
-            for line in tqdm_cur(f):
-                if '\t' not in line:
-                    continue
-                line = line.split('\t')[1].lower()
-
-                words = get_clean_words(line)
-                len_words = len(words)
-                self.words.update(set(words))
-
-                for i, word in enumerate(words):
-                    self.unigram_words_count += 1
-                    self.unigram_model[word] += 1
-
-                    if i != len_words - 1:
-                        self.bigram_words_count += 1
-                        word_2 = words[i + 1]
-                        self.bigram_model[word][word_2] += 1
-        
-        self.normalize_stat()
-    
+        """Counts are replaced by arrays"""
+        words = sorted(self.unigram_counts)
+        word_ids = {word: word_id for word_id, word in enumerate(words)}
+        unigram = np.array([self.unigram_counts[word] for word in words], dtype=np.uint32)
+
+        lengths = np.zeros(len(words), dtype=np.uint64)
+        successors = []
+        counts = []
+        for word_1, next_words in self.bigram_counts.items():
+            lengths[word_ids[word_1]] = len(next_words)
+        for word_1 in sorted(self.bigram_counts, key=word_ids.get):
+            row = sorted((word_ids[word_2], count) for word_2, count in self.bigram_counts[word_1].items())
+            successors.extend(word_id for word_id, _ in row)
+            counts.extend(count for _, count in row)
+        offsets = np.zeros(len(words) + 1, dtype=np.uint64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        log_probs = -np.log(np.array(counts, dtype=np.float64) / max(self.bigram_words_count, 1))
+        scale = 65535 / log_probs.max() if len(log_probs) and log_probs.max() > 0 else 1.0
+        self._init_arrays(words, unigram, offsets, np.array(successors, dtype=np.uint32),
+                          np.round(log_probs * scale).astype(np.uint16), scale)
+        self.unigram_counts = defaultdict(int)
+        self.bigram_counts = defaultdict(lambda: defaultdict(int))
+
+    def make_model(self, filename="queries_all.txt", workers=1):
+        make_models([self], filename, workers)
+
+    def _bigram_position(self, word_1, word_2):
+        """Position of bigram in successors, None if there is no such bigram"""
+        id_1, id_2 = self.words.get(word_1), self.words.get(word_2)
+        if id_1 is None or id_2 is None:
+            return None
+        end = self._offsets[id_1 + 1]
+        position = bisect_left(self._successors, id_2, self._offsets[id_1], end)
+        if position < end and self._successors[position] == id_2:
+            return position
+        return None
+
     def unigram_prob(self, word):
-        if word in self.unigram_model:
-            return self.unigram_model[word]
+        if word in self.words:
+            return int(self.unigram[self.words[word]]) / self.unigram_words_count
         return 1 / self.unigram_words_count
-    
+
     def bigram_prob(self, word_1, word_2):
-        if word_1 in self.bigram_model and word_2 in self.bigram_model[word_1]:
-            return self.bigram_model[word_1][word_2]
-        return 1 / self.bigram_words_count
-    
+        return math.exp(self.bigram_log_prob(word_1, word_2))
+
+    def unigram_log_prob(self, word):
+        return math.log(self.unigram_prob(word))
+
+    def bigram_log_prob(self, word_1, word_2):
+        position = self._bigram_position(word_1, word_2)
+        if position is None:
+            return -math.log(self.bigram_words_count)
+        return -self._log_probs[position] / self.scale
+
     def query_prob(self, query):
         words = get_clean_words(query.lower())
         len_words = len(words)
@@ -97,26 +150,44 @@ class LanguageModel:
             else:
                 prob *= 1 / self.unigram_prob(word)
         return prob
-    
+
     def predict_next_word(self, word, n=None):
         word = word.lower()
-        if word not in self.bigram_model:
+        if word not in self.words:
             return []
-        all_words = list(self.bigram_model[word].items())
-        all_words.sort(key=lambda x: x[1], reverse=True)
-        result = [elem[0] for elem in all_words]
+        start, end = self._offsets[self.words[word]], self._offsets[self.words[word] + 1]
+        order = np.argsort(self.log_probs[start:end], kind='stable')
+        result = [self.word_list[word_id] for word_id in self.successors[start:end][order].tolist()]
         if n:
             result = result[:n]
         return result
-    
-    def save_model(self, filename='language_model.json', directory='prepared_data'):
+
+    def save_model(self, filename='language_model.bin', directory='prepared_data'):
         check_dir_or_create(directory)
-        data_to_save = self._make_data_to_save()
-        with open(directory + '/' + filename, 'w') as f:
-            f.write(json.dumps(data_to_save))
-    
-    def load_model(self, filename='language_model.json', directory='prepared_data'):
+        words = '\n'.join(self.word_list).encode('utf-8')
+        header = self.HEADER.pack(self.MAGIC, len(self.words), len(self.successors),
+                                  self.unigram_words_count, self.bigram_words_count, self.scale)
+        with open(directory + '/' + filename, 'wb') as f:
+            f.write(header)
+            for array in (self.offsets, self.unigram, self.successors, self.log_probs):
+                f.write(array.tobytes())
+            f.write(words)
+
+    def load_model(self, filename='language_model.bin', directory='prepared_data'):
         check_dir_or_create(directory)
-        with open(directory + '/' + filename, 'r') as f:
-            data = json.loads(f.read())
-        self._init_by_saved_data(data)
+        with open(directory + '/' + filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_words, n_bigrams, self.unigram_words_count, self.bigram_words_count, scale = \
+            self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC:
+            raise RuntimeError(f"Wrong language model format: {directory}/{filename}")
+
+        arrays = []
+        offset = self.HEADER.size
+        for dtype, count in ((np.uint64, n_words + 1), (np.uint32, n_words),
+                             (np.uint32, n_bigrams), (np.uint16, n_bigrams)):
+            arrays.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset))
+            offset += arrays[-1].nbytes
+        offsets, unigram, successors, log_probs = arrays
+        words = data[offset:].decode('utf-8').split('\n') if n_words else []
+        self._init_arrays(words, unigram, offsets, successors, log_probs, scale)
@@ -0,0 +1,188 @@
+import heapq
+import pickle
+from itertools import count
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = lambda x, *args, **kwargs: x
+
+from utils import check_dir_or_create, change_layout
+
+
+class Node:
+    def __init__(self, symb):
+        self.symb = symb
+        self._next = {}
+
+        self._is_end = False
+        # the least and the greatest count of letters after this node in words of its subtree
+        self._depths = (0, 0)
+
+    def add_word(self, word):
+        node = self
+        for symb in word:
+            if symb not in node._next:
+                node._next[symb] = Node(symb)
+            node = node._next[symb]
+        node._is_end = True
+
+
+class SearchTree:
+    """
+    Trie of dictionary words, fuzzy search is best-first (A*) over states (node, position in word):
+    states are taken from the heap in order of error, so words are found in order of error
+    and search stops after n words, without recursion and without collecting all variants below max_error.
+    Estimate of the rest: every unit of difference between count of remaining letters of word and lengths of words
+    in subtree of node needs insert or delete, error of which is not less than error of the cheapest one.
+
+    Error of edit is 1 / P(orig|fix) of ErrorModel for bigrams (previous letter + letter), as in ErrorModel.stat:
+    delete of typed letter - (prev + letter, prev + '~'), replace - (prev + letter, prev + next),
+    insert of letter which is not typed - (prev + '~', prev + next). Matching letter costs nothing
+    """
+
+    def __init__(self, error_model, words=None):
+        self.root = Node('^')
+        self.error_model = error_model
+        self.alphabet = set()
+        self._costs = {}
+        self._min_insert = self._min_delete = 0
+        if words is not None:
+            self.make_tree(words)
+
+    def make_tree(self, words):
+        self.root = Node('^')
+        for word in tqdm(words):
+            if word:
+                self.root.add_word(word)
+        self._prepare()
+
+    def _prepare(self):
+        """Alphabet, depths of nodes and the cheapest insert and delete, without recursion"""
+        self._costs = {}
+        self.alphabet = set()
+        nodes = [self.root]
+        for node in nodes:
+            self.alphabet.update(node._next)
+            nodes.extend(node._next.values())
+        for node in reversed(nodes):
+            depths = [(0, 0)] if node._is_end else []
+            depths += [(next_node._depths[0] + 1, next_node._depths[1] + 1) for next_node in node._next.values()]
+            node._depths = (min(depth[0] for depth in depths), max(depth[1] for depth in depths)) if depths else (0, 0)
+
+        stat = self.error_model.stat
+        unknown = 1 / self.error_model._get_stats('', '')
+        self._min_insert = min([1 / p for orig in stat if orig[-1] == '~' for p in stat[orig].values()] + [unknown])
+        self._min_delete = min([1 / p for orig in stat for fix, p in stat[orig].items() if fix[-1] == '~'] + [unknown])
+
+    def _fixes(self, orig):
+        """Errors of edits of bigram orig: {last letter of fix: 1 / P(orig|fix)} for fixes with the same first letter"""
+        costs = self._costs.get(orig)
+        if costs is None:
+            fixes = self.error_model.stat.get(orig, {})
+            costs = self._costs[orig] = {fix[1]: 1 / fixes[fix] for fix in fixes if fix[0] == orig[0]}
+        return costs
+
+    def search(self, word, max_error=10000, max_insert=10, max_delete=10, n=20,
+               widen=10, max_widen=3, max_states=5000, with_errors=False):
+        """
+        At most n words with the least error, sorted by error (pairs (word, error) if with_errors).
+        If there is no word with error <= max_error, max_error is multiplied by widen (at most max_widen times).
+        At most max_states states are expanded, so time of search does not depend on size of the tree
+        """
+        # unknown edit has probability 1 / size of stat (as in ErrorModel._get_stats)
+        unknown = 1 / self.error_model._get_stats('', '')
+        variants = [word]
+        switched = change_layout(word)
+        if switched != word and set(switched) <= self.alphabet:
+            variants.append(switched)
+
+        tie = count()
+        heap = []
+        deferred = []  # states with error > max_error, they are used only if max_error is widened
+        visited = set()
+        result = []
+        found = set()
+
+        def push(error, node, pos, i, prefix, inserts, deletes):
+            left = len(variants[i]) - pos
+            least, greatest = node._depths
+            bound = max(left - greatest, 0) * self._min_delete + max(least - left, 0) * self._min_insert
+            state = (error + bound, next(tie),
+                     error, node, pos, i, prefix, inserts, deletes)
+            if state[0] <= max_error:
+                heapq.heappush(heap, state)
+            else:
+                deferred.append(state)
+
+        for i in range(len(variants)):
+            push(0, self.root, 0, i, '', 0, 0)
+
+        while len(result) < n and len(visited) < max_states:
+            if not heap:
+                if result or max_widen == 0 or not deferred:
+                    break
+                max_error *= widen
+                max_widen -= 1
+                states, deferred = deferred, []
+                for state in states:
+                    if state[0] <= max_error:
+                        heapq.heappush(heap, state)
+                    else:
+                        deferred.append(state)
+                continue
+
+            _, _, error, node, pos, i, prefix, inserts, deletes = heapq.heappop(heap)
+            if (node, pos, i) in visited:
+                continue
+            visited.add((node, pos, i))
+            current = variants[i]
+
+            if pos == len(current):
+                if node._is_end and prefix not in found:
+                    found.add(prefix)
+                    result.append((prefix, error))
+            else:
+                symb = current[pos]
+                fixes = self._fixes(node.symb + symb)
+                if symb in node._next:
+                    push(error, node._next[symb], pos + 1, i, prefix + symb, inserts, deletes)
+
+                if deletes < max_delete:
+                    push(error + fixes.get('~', unknown), node, pos + 1, i, prefix, inserts, deletes + 1)
+
+                for next_symb, next_node in node._next.items():
+                    if next_symb != symb and (next_node, pos + 1, i) not in visited:
+                        push(error + fixes.get(next_symb, unknown), next_node, pos + 1, i,
+                             prefix + next_symb, inserts, deletes)
+
+            if inserts < max_insert:
+                fixes = self._fixes(node.symb + '~')
+                for next_symb, next_node in node._next.items():
+                    if (next_node, pos, i) not in visited:
+                        push(error + fixes.get(next_symb, unknown), next_node, pos, i,
+                             prefix + next_symb, inserts + 1, deletes)
+
+        result = result or [(word, 0)]
+        return result if with_errors else [elem[0] for elem in result]
+
+    def words(self):
+        """All words of tree, without recursion"""
+        words = []
+        stack = [(self.root, '')]
+        while stack:
+            node, prefix = stack.pop()
+            if node._is_end:
+                words.append(prefix)
+            stack.extend((next_node, prefix + symb) for symb, next_node in node._next.items())
+        return words
+
+    def save_model(self, filename='search_tree.pickle', directory='prepared_data'):
+        """Words are saved as flat list: pickle of nested nodes recurses once per letter of the longest word"""
+        check_dir_or_create(directory)
+        with open(directory + '/' + filename, 'wb') as f:
+            pickle.dump(sorted(self.words()), f)
+
+    def load_model(self, filename='search_tree.pickle', directory='prepared_data'):
+        check_dir_or_create(directory)
+        with open(directory + '/' + filename, 'rb') as f:
+            self.make_tree(pickle.load(f))
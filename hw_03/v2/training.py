@@ -0,0 +1,68 @@
+import io
+import os
+import locale
+from multiprocessing import Pool
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = lambda x, *args, **kwargs: x
+
+
+def file_chunks(filename, chunk_size=1 << 24):
+    """Byte ranges (start, end) of file of about chunk_size bytes, every range ends at the end of line"""
+    size = os.path.getsize(filename)
+    chunks = []
+    start = 0
+    with open(filename, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def read_chunk(filename, start, end):
+    """Lines of byte range of file, the same as lines of the file opened in text mode"""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return list(io.StringIO(data.decode(locale.getpreferredencoding(False)), newline=None))
+
+
+def _count_chunk(args):
+    filename, start, end, model_classes = args
+    lines = read_chunk(filename, start, end)
+    counts = []
+    for model_class in model_classes:
+        model = model_class()
+        model._init_counts()
+        model._count_lines(lines)
+        counts.append(model._counts())
+    return counts
+
+
+def make_models(models, filename='queries_all.txt', workers=1, chunk_size=1 << 24):
+    """
+    Statistics of all models are counted in one pass over file: file is split into chunks by byte offsets,
+    every chunk is counted by worker process (by this process if workers == 1), counts of chunks
+    are merged in order of chunks and then normalized, so models are the same for any workers and chunk_size
+    """
+    for model in models:
+        model._init_counts()
+    chunks = [(filename, start, end, [type(model) for model in models])
+              for start, end in file_chunks(filename, chunk_size)]
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            for counts in tqdm(pool.imap(_count_chunk, chunks), total=len(chunks)):
+                for model, model_counts in zip(models, counts):
+                    model._merge_counts(model_counts)
+    else:
+        for counts in tqdm(map(_count_chunk, chunks), total=len(chunks)):
+            for model, model_counts in zip(models, counts):
+                model._merge_counts(model_counts)
+
+    for model in models:
+        model.normalize_stat()
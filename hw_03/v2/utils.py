@@ -0,0 +1,44 @@
+import os
+import re
+
+
+def check_dir_or_create(directory):
+    if not os.path.exists(directory):
+        os.mkdir(directory)
+
+
+def word_clean(word):
+    return word
+    res = re.sub(r'\W', '', word)
+    return res or word
+
+
+def get_clean_words(s):
+    return list(map(word_clean, s.lower().split()))
+
+
+layout = {'1': '1', '2': '2', '3': '3', '4': '4', '5': '5', '6': '6', '7': '7', '8': '8', '9': '9', '0': '0',
+          '-': '-', '=': '=', 'q': 'й', 'w': 'ц', 'e': 'у', 'r': 'к', 't': 'е', 'y': 'н', 'u': 'г', 'i': 'ш',
+          'o': 'щ', 'p': 'з', '[': 'х', ']': 'ъ', '\\':'\\','a': 'ф', 's': 'ы', 'd': 'в', 'f': 'а', 'g': 'п',
+          'h': 'р', 'j': 'о', 'k': 'л', 'l': 'д', ';': 'ж', '\'':'э', 'z': 'я', 'x': 'ч', 'c': 'с', 'v': 'м',
+          'b': 'и', 'n': 'т', 'm': 'ь', ',': 'б', '.': 'ю', '/': '.', '!': '!', '@': '"', '#': '№', '$': ';',
+          '%': '%', '^': ':', '&': '?', '*': '*', '(': '(', ')': ')', '_': '_', '+': '+', 'Q': 'Й', 'W': 'Ц',
+          'E': 'У', 'R': 'К', 'T': 'Е', 'Y': 'Н', 'U': 'Г', 'I': 'Ш', 'O': 'Щ', 'P': 'З', '{': 'Х', '}': 'Ъ',
+          '|': '/', 'A': 'Ф', 'S': 'Ы', 'D': 'В', 'F': 'А', 'G': 'П', 'H': 'Р', 'J': 'О', 'K': 'Л', 'L': 'Д',
+          ':': 'Ж', '"': 'Э', 'Z': 'Я', 'X': 'Ч', 'C': 'С', 'V': 'М', 'B': 'И', 'N': 'Т', 'M': 'Ь', '<': 'Б',
+          '>': 'Ю', '?': ',', ' ': ' ',
+          
+          '1': '1', '2': '2', '3': '3', '4': '4', '5': '5', '6': '6', '7': '7', '8': '8', '9': '9', '0': '0',
+          '-': '-', '=': '=', 'й': 'q', 'ц': 'w', 'у': 'e', 'к': 'r', 'е': 't', 'н': 'y', 'г': 'u', 'ш': 'i',
+          'щ': 'o', 'з': 'p', 'х': '[', 'ъ': ']', '\\':'\\','ф': 'a', 'ы': 's', 'в': 'd', 'а': 'f', 'п': 'g',
+          'р': 'h', 'о': 'j', 'л': 'k', 'д': 'l', 'ж': ';', 'э': "'", 'я': 'z', 'ч': 'x', 'с': 'c', 'м': 'v',
+          'и': 'b', 'т': 'n', 'ь': 'm', 'б': ',', 'ю': '.', '.': '/', '!': '!', '"': '@', '№': '#', ';': '$',
+          '%': '%', ':': '^', '?': '&', '*': '*', '(': '(', ')': ')', '_': '_', '+': '+', 'Й': 'Q', 'Ц': 'W',
+          'У': 'E', 'К': 'R', 'Е': 'T', 'Н': 'Y', 'Г': 'U', 'Ш': 'I', 'Щ': 'O', 'З': 'P', 'Х': '{', 'Ъ': '}',
+          '/': '|', 'Ф': 'A', 'Ы': 'S', 'В': 'D', 'А': 'F', 'П': 'G', 'Р': 'H', 'О': 'J', 'Л': 'K', 'Д': 'L',
+          'Ж': ':', 'Э': '"', 'Я': 'Z', 'Ч': 'X', 'С': 'C', 'М': 'V', 'И': 'B', 'Т': 'N', 'Ь': 'M', 'Б': '<',
+          'Ю': '>', ',': '?', '`': 'ё', '~': 'Ё', 'ё': '`', 'Ё': '~'}
+
+
+def change_layout(word):
+    return ''.join([layout[elem] if elem in layout else '~' for elem in word])
@@ -0,0 +1,112 @@
+from collections import Counter
+
+import numpy as np
+
+
+class BM25:
+    """
+    BM25 of notebook (BM25_score) for all candidate documents of queries at once.
+    Term-document matrix is CSR (indptr, indices, data) built once, data is the whole
+    idf * tf * (k + 1) / (tf + k * (1 - b + b * len / avg_len)) of the pair, so score of document
+    is the sum of its data at words of query (with repeats, as in BM25_score).
+    idf is 1 / (number of documents with word), avg_len is average length of documents of the model.
+    Data of pairs (document, word) is found by binary search over keys = document * len(words) + word,
+    which are sorted in CSR order
+    """
+
+    def __init__(self, docs, k=2, b=0.75):
+        """docs is {doc_id: list of words} (docs_headers of notebook) or (doc_id, words) pairs"""
+        docs = docs.items() if isinstance(docs, dict) else docs
+        self.k = k
+        self.b = b
+        self.words = {}
+        doc_ids = []
+        lengths = []
+        word_ids = []
+        for doc_id, doc_words in docs:
+            doc_ids.append(doc_id)
+            lengths.append(len(doc_words))
+            word_ids.extend(self.words.setdefault(word, len(self.words)) for word in doc_words)
+        self.doc_ids = np.array(doc_ids, dtype=np.int64)
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self._doc_positions = {doc_id: position for position, doc_id in enumerate(doc_ids)}
+        self.avg_len = self.lengths.mean() if len(lengths) else 0.0
+
+        rows = np.repeat(np.arange(len(doc_ids), dtype=np.int64), self.lengths)
+        keys, tf = np.unique(rows * len(self.words) + np.array(word_ids, dtype=np.int64), return_counts=True)
+        self.indptr = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // max(len(self.words), 1), minlength=len(doc_ids)), out=self.indptr[1:])
+        self.indices = keys % max(len(self.words), 1)
+        self._keys = keys
+
+        self.idf = 1 / np.bincount(self.indices, minlength=len(self.words))
+        norm = k * (1 - b + b * (self.lengths / (self.avg_len or 1)))
+        self.data = self.idf[self.indices] * (tf * (k + 1)) / (tf + np.repeat(norm, np.diff(self.indptr)))
+
+    @classmethod
+    def from_store(cls, store, doc_ids, field='title', k=2, b=0.75, tokenizer=lambda text: text.lower().split()):
+        """Model of field ('title' or 'body') of documents of doc_store.DocStore"""
+        field_num = ('title', 'body').index(field)
+        docs = store.get_many(doc_ids)
+        return cls(((doc_id, tokenizer(fields[field_num] if len(fields) > field_num else ''))
+                    for doc_id, fields in docs.items()), k, b)
+
+    def _pairs(self, queries, query_to_docs):
+        """
+        keys of (document, word) of all pairs of query and its candidate by all words of query, numbers of the word
+        in query, indices of pairs and numbers of candidates of queries
+        """
+        positions = []
+        sizes = []
+        word_ids = []
+        counts = []
+        words_nums = []
+        for query_id, query in queries:
+            doc_ids = query_to_docs[query_id]
+            positions.extend(self._doc_positions[doc_id] for doc_id in doc_ids)
+            sizes.append(len(doc_ids))
+            query_counts = Counter(self.words[word] for word in query if word in self.words)
+            word_ids.extend(query_counts.keys())
+            counts.extend(query_counts.values())
+            words_nums.append(len(query_counts))
+
+        positions = np.array(positions, dtype=np.int64)
+        word_ids = np.array(word_ids, dtype=np.int64)
+        counts = np.array(counts, dtype=np.float64)
+        sizes = np.array(sizes, dtype=np.int64)
+        words_nums = np.array(words_nums, dtype=np.int64)
+        words_starts = np.cumsum(words_nums) - words_nums
+
+        # every pair is repeated by number of words of its query
+        pair_words_nums = np.repeat(words_nums, sizes)
+        pairs = np.repeat(np.arange(len(positions)), pair_words_nums)
+        first = np.cumsum(pair_words_nums) - pair_words_nums
+        words = np.arange(len(pairs)) - np.repeat(first - np.repeat(words_starts, sizes), pair_words_nums)
+        return positions[pairs] * len(self.words) + word_ids[words], counts[words], pairs, sizes
+
+    def score_batch(self, queries, query_to_docs):
+        """
+        {query_id: scores of query_to_docs[query_id] in its order}, queries is {query_id: list of words}
+        or list of queries (query_id is index), all pairs are scored by a few numpy operations
+        """
+        queries = list(queries.items() if isinstance(queries, dict) else enumerate(queries))
+        queries = [(query_id, query) for query_id, query in queries if query_id in query_to_docs]
+        keys, counts, pairs, sizes = self._pairs(queries, query_to_docs)
+
+        found = np.searchsorted(self._keys, keys)
+        found[found == len(self._keys)] = 0
+        values = np.where(self._keys[found] == keys, self.data[found], 0.0) if len(self._keys) else np.zeros(len(keys))
+        scores = np.bincount(pairs, weights=values * counts, minlength=sizes.sum()).astype(np.float64)
+        return dict(zip((query_id for query_id, _ in queries), np.split(scores, np.cumsum(sizes)[:-1])))
+
+    def score(self, query, doc_ids):
+        """Scores of doc_ids for query (list of words)"""
+        return self.score_batch([query], {0: doc_ids})[0]
+
+    def rank(self, queries, query_to_docs):
+        """(query_id, doc_id) of candidates of every query by descending score, as rank_list of notebook"""
+        rank_list = []
+        for query_id, scores in self.score_batch(queries, query_to_docs).items():
+            doc_ids = np.asarray(query_to_docs[query_id])
+            rank_list.extend((query_id, doc_id) for doc_id in doc_ids[np.argsort(scores)[::-1]].tolist())
+        return rank_list
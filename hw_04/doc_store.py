@@ -0,0 +1,212 @@
+import json
+import mmap
+import os
+import zlib
+from collections import OrderedDict
+from sys import argv
+
+import numpy as np
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = lambda x, *args, **kwargs: x
+
+INDEX_DTYPE = np.dtype([('doc_id', '<i8'), ('file', '<u2'), ('block', '<u4'), ('offset', '<u8'), ('length', '<u4')])
+BLOCK_DTYPE = np.dtype([('file', '<u2'), ('offset', '<u8'), ('length', '<u4')])
+
+
+def _compressor(compression, level=None):
+    if compression == 'zlib':
+        return lambda data: zlib.compress(data, 6 if level is None else level)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('zstandard is required for zstd compression')
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress
+    raise ValueError(f'Unknown compression: {compression}')
+
+
+def _decompressor(compression):
+    if compression == 'zlib':
+        return zlib.decompress
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('zstandard is required for zstd compression')
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f'Unknown compression: {compression}')
+
+
+def build_doc_store(filenames, directory='docs_store', compression=None, block_size=1 << 14, needed_ids=None):
+    """
+    Converts split tsv files (doc_id, title, body) into the store in directory: data file for every tsv file
+    with records (fields of line after doc_id, joined by tabs), index.npy with doc_id -> (file, block, offset, length)
+    sorted by doc_id, blocks.npy and meta.json.
+    Without compression offset is the offset of record in data file, with compression ('zlib' or 'zstd')
+    records are joined into blocks of about block_size bytes, every block is compressed separately
+    and offset is the offset of record in uncompressed block (so random access decompresses block_size bytes).
+    If needed_ids is given, only these documents are stored
+    """
+    if compression is not None:
+        compress = _compressor(compression)
+    os.makedirs(directory, exist_ok=True)
+    index = []
+    blocks = []
+    data_files = []
+
+    for file_num, filename in enumerate(tqdm(filenames)):
+        data_filename = f'{file_num:04d}.bin'
+        data_files.append(data_filename)
+        with open(filename, 'rb') as f_in, open(os.path.join(directory, data_filename), 'wb') as f_out:
+            block = []
+            block_len = 0
+
+            def flush_block():
+                nonlocal block, block_len
+                data = compress(b''.join(block))
+                blocks.append((file_num, f_out.tell(), len(data)))
+                f_out.write(data)
+                block = []
+                block_len = 0
+
+            for line in f_in:
+                tab = line.find(b'\t')
+                if tab < 0:
+                    continue
+                doc_id = int(line[:tab])
+                if needed_ids is not None and doc_id not in needed_ids:
+                    continue
+                record = line[tab + 1:].rstrip(b'\r\n')
+                if compression is None:
+                    index.append((doc_id, file_num, 0, f_out.tell(), len(record)))
+                    f_out.write(record)
+                else:
+                    index.append((doc_id, file_num, len(blocks), block_len, len(record)))
+                    block.append(record)
+                    block_len += len(record)
+                    if block_len >= block_size:
+                        flush_block()
+            if block:
+                flush_block()
+
+    index = np.array(index, dtype=INDEX_DTYPE)
+    index = index[np.argsort(index['doc_id'], kind='stable')]
+    np.save(os.path.join(directory, 'index.npy'), index)
+    np.save(os.path.join(directory, 'blocks.npy'), np.array(blocks, dtype=BLOCK_DTYPE))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'compression': compression, 'files': data_files,
+                   'sources': [os.path.basename(filename) for filename in filenames]}, f)
+
+
+class DocStore:
+    """
+    Random access to documents of store made by build_doc_store.
+    Index is memory-mapped, position of doc_id in index is found by table indexed by doc_id
+    (or by binary search if ids are too sparse for table), data files are memory-mapped,
+    the last cache_blocks decompressed blocks are kept
+    """
+
+    def __init__(self, directory='docs_store', cache_blocks=64):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        self.compression = meta['compression']
+        self.index = np.load(os.path.join(directory, 'index.npy'), mmap_mode='r')
+        self.blocks = np.load(os.path.join(directory, 'blocks.npy'))
+        self._decompress = _decompressor(self.compression) if self.compression is not None else None
+        self._cache = OrderedDict()
+        self._cache_blocks = cache_blocks
+
+        self._data = []
+        for data_filename in meta['files']:
+            with open(os.path.join(directory, data_filename), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                self._data.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b'')
+
+        doc_ids = np.asarray(self.index['doc_id'])
+        self._doc_ids = doc_ids
+        self._positions = None
+        if len(doc_ids) and doc_ids[0] >= 0 and doc_ids[-1] <= 4 * len(doc_ids) + (1 << 20):
+            self._positions = np.full(doc_ids[-1] + 1, -1, dtype=np.int64)
+            self._positions[doc_ids] = np.arange(len(doc_ids))
+
+    def __len__(self):
+        return len(self.index)
+
+    def _positions_of(self, doc_ids):
+        doc_ids = np.asarray(doc_ids, dtype=np.int64).reshape(-1)
+        if self._positions is not None:
+            inside = (doc_ids >= 0) & (doc_ids < len(self._positions))
+            positions = np.full(len(doc_ids), -1, dtype=np.int64)
+            positions[inside] = self._positions[doc_ids[inside]]
+        else:
+            positions = np.searchsorted(self._doc_ids, doc_ids)
+            found = positions < len(self._doc_ids)
+            found[found] = self._doc_ids[positions[found]] == doc_ids[found]
+            positions[~found] = -1
+        if (positions < 0).any():
+            raise KeyError(doc_ids[np.argmax(positions < 0)].item())
+        return positions
+
+    def _position(self, doc_id):
+        doc_id = int(doc_id)
+        if self._positions is not None:
+            if 0 <= doc_id < len(self._positions) and self._positions[doc_id] >= 0:
+                return int(self._positions[doc_id])
+        else:
+            position = int(np.searchsorted(self._doc_ids, doc_id))
+            if position < len(self._doc_ids) and self._doc_ids[position] == doc_id:
+                return position
+        raise KeyError(doc_id)
+
+    def __contains__(self, doc_id):
+        try:
+            self._position(doc_id)
+        except KeyError:
+            return False
+        return True
+
+    def _block(self, block_num):
+        if block_num in self._cache:
+            self._cache.move_to_end(block_num)
+        else:
+            file_num, offset, length = self.blocks[block_num].tolist()
+            self._cache[block_num] = self._decompress(self._data[file_num][offset:offset + length])
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return self._cache[block_num]
+
+    def _raw_record(self, row):
+        _, file_num, block_num, offset, length = row
+        if self.compression is None:
+            return self._data[file_num][offset:offset + length]
+        return self._block(block_num)[offset:offset + length]
+
+    def _record(self, row):
+        return self._raw_record(row).decode('utf-8').split('\t')
+
+    def get(self, doc_id):
+        """Fields of document after doc_id: [title, body]"""
+        return self._record(self.index[self._position(doc_id)].tolist())
+
+    def _sorted_rows(self, doc_ids):
+        """Rows of index of doc_ids in order of data files"""
+        rows = self.index[np.sort(self._positions_of(list(doc_ids)))]
+        return rows[np.lexsort((rows['offset'], rows['block'], rows['file']))].tolist()
+
+    def get_many(self, doc_ids):
+        """{doc_id: fields} of all doc_ids, records are read in order of files, so reading is sequential"""
+        return {row[0]: self._record(row) for row in self._sorted_rows(doc_ids)}
+
+    def headers(self, doc_ids):
+        """{doc_id: words of title} as docs_headers of notebook, bodies are not decoded"""
+        return {row[0]: self._raw_record(row).split(b'\t', 1)[0].decode('utf-8').lower().split()
+                for row in self._sorted_rows(doc_ids)}
+
+
+if __name__ == '__main__':
+    # python doc_store.py DATA_SPLIT_DIRECTORY [store directory] [zlib|zstd]
+    data_directory = argv[1]
+    filenames = [os.path.join(data_directory, filename) for filename in sorted(os.listdir(data_directory))]
+    build_doc_store(filenames, argv[2] if len(argv) > 2 else 'docs_store', argv[3] if len(argv) > 3 else None)